@@ -1,5 +1,7 @@
 import os
 import logging
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
 import jinja2
 import aiohttp_jinja2 as aiojinja
 from aiohttp import web
@@ -13,15 +15,82 @@ logging.basicConfig(level=logging.DEBUG)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
+STATUSES = tuple(
+    value for key, value in vars(Message.Status).items() if not key.startswith("_")
+)
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
 class MessageView(web.View):
 
-    @aiojinja.template("index.jinja2")
-    async def get(self):
-        msgs = [msg.cleaned_data async for msg in Message.wrap_raw(Message.manager.all())]
+    def get_filters(self):
+        """
+        :return: validated filters from query string and page cursor
+        :raises: web.HTTPBadRequest
+        """
+        query = self.request.query
+        filters = {}
+        try:
+            if query.get("status"):
+                if query["status"] not in STATUSES:
+                    raise ValueError(query["status"])
+                filters["status"] = query["status"]
+            if query.get("recipient"):
+                filters["recipient"] = int(query["recipient"])
+            if query.get("since"):
+                filters["since"] = parse_date(query["since"])
+            if query.get("until"):
+                filters["until"] = parse_date(query["until"]) + timedelta(days=1)
+            before = None
+            if query.get("before"):
+                created, message_id = query["before"].split("_", 1)
+                before = (datetime.fromtimestamp(float(created), timezone.utc), message_id)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"Bad filter: {e}")
+        return filters, before
+
+    def page_url(self, message=None):
+        """
+        :param message: last message of current page, None for the first page
+        """
+        params = {key: value for key, value in self.request.query.items() if key != "before" and value}
+        if message is not None:
+            params["before"] = f"{message.created.timestamp()!r}_{message.id}"
+        return f"{self.request.path}?{urlencode(params)}"
 
-        return {
-            "messages": msgs
-        }
+    async def get(self):
+        """
+        Stream page of messages, rows are rendered while cursor is read
+        """
+        filters, before = self.get_filters()
+        page_size = Config.ADMIN["page_size"]
+        env = aiojinja.get_env(self.request.app)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        await response.prepare(self.request)
+        await response.write(env.get_template("messages_header.jinja2").render(
+            query=self.request.query, statuses=STATUSES
+        ).encode("utf-8"))
+
+        row = env.get_template("message_row.jinja2")
+        query = Message.page_query(page_size + 1, before=before, **filters)
+        shown, last, next_url = 0, None, None
+        async for msg in Message.iterate(query):
+            if shown == page_size:
+                # the query is limited to one extra row, the cursor is exhausted right after it
+                next_url = self.page_url(last)
+                continue
+            await response.write(row.render(msg=msg).encode("utf-8"))
+            shown, last = shown + 1, msg
+
+        await response.write(env.get_template("messages_footer.jinja2").render(
+            next_url=next_url, first_url=self.page_url() if before else None
+        ).encode("utf-8"))
+        await response.write_eof()
+        return response
 
     def get_recipient_id(self):
         return 182520296
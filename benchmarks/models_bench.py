@@ -0,0 +1,84 @@
+"""
+Models benchmark, measure construction/serialisation rate and memory per instance
+
+    python -m benchmarks.models_bench [count]
+"""
+import sys
+import time
+import tracemalloc
+
+from models import Message, User
+from models.base import ModelManager
+
+
+RAW_MESSAGE = {
+    "id": "0b6f5c8e-1b7a-4c2e-9a57-3f1d2c9e8a10",
+    "recipient": 182520296,
+    "body": 'Вышла новая серия сериала "Рик и Морти" 4 сезон 1 серия',
+    "last_update": 1546300800,
+    "created": 1546300800,
+    "status": "READY",
+    "error": "",
+    "attempts": 0,
+    "not_before": None,
+    "lease_expires": None
+}
+
+RAW_USER = {
+    "id": 182520296,
+    "chat_id": 182520296,
+    "first_name": "Rick",
+    "last_name": "Sanchez",
+    "username": "rick",
+    "is_active": True,
+    "is_bot": False,
+    "language_code": "ru",
+    "type": "private",
+    "serials": [{"id": 1234, "title": "Рик и Морти", "voice": None, "excluded_voices": []}]
+}
+
+
+def rate(func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - start)
+
+
+def instance_size(model, raw, count):
+    """
+    :return: bytes allocated per instance
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [model(**raw) for _ in range(count)]
+    size = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    del instances
+    return size
+
+
+def main(count=200000):
+    for model in (Message, User):
+        model.manager = ModelManager(model.table_name, None)
+
+    message = Message(**RAW_MESSAGE)
+    cases = (
+        ("message construct", lambda: Message(**RAW_MESSAGE)),
+        ("message cleaned_data", lambda: message.cleaned_data),
+        ("message construct+dump", lambda: Message(**RAW_MESSAGE).cleaned_data),
+        ("message attribute", lambda: message.status),
+        ("user construct+dump", lambda: User(**RAW_USER).cleaned_data),
+        ("manager method", lambda: Message.manager.get),
+    )
+    print(f"{'case':<26}{'ops/s':>14}")
+    for case, func in cases:
+        print(f"{case:<26}{rate(func, count):>14.0f}")
+
+    for model, raw in ((Message, RAW_MESSAGE), (User, RAW_USER)):
+        print(f"{model.__name__} instance: {instance_size(model, raw, count // 10):.0f} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,67 @@
+"""
+Extractors benchmark, compare engines output on saved pages and measure pages/second
+
+    python -m benchmarks.parsers_bench [iterations]
+"""
+import os
+import sys
+import time
+
+from parsers.extractors import ENGINES
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SERIAL_URL = "http://hdrezka.ag/series/comedy/1234-rick-and-morty-2013.html"
+
+CASES = (
+    ("listing", "listing.html", "extract_serial_urls", ()),
+    ("serial", "serial.html", "extract_serial", (SERIAL_URL,)),
+    ("serial_finished", "serial_finished.html", "extract_serial", (SERIAL_URL,)),
+    ("updates", "home.html", "extract_updates", ()),
+)
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def check_parity():
+    """
+    :return: list of case names where engines results differ
+    """
+    mismatches = []
+    for case, fixture, extractor, args in CASES:
+        raw_html = load_fixture(fixture)
+        results = {name: getattr(engine, extractor)(raw_html, *args) for name, engine in ENGINES.items()}
+        reference = next(iter(results.values()))
+        if not reference or any(result != reference for result in results.values()):
+            mismatches.append(case)
+    return mismatches
+
+
+def measure(engine, extractor, raw_html, args, iterations):
+    func = getattr(engine, extractor)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(raw_html, *args)
+    return iterations / (time.perf_counter() - start)
+
+
+def main(iterations=200):
+    mismatches = check_parity()
+    if mismatches:
+        print(f"Engines results differ: {', '.join(mismatches)}")
+        return 1
+    print("Engines results are identical")
+
+    print(f"{'case':<16}" + "".join(f"{name + ' pages/s':>18}" for name in ENGINES))
+    for case, fixture, extractor, args in CASES:
+        raw_html = load_fixture(fixture)
+        speeds = [measure(engine, extractor, raw_html, args, iterations) for engine in ENGINES.values()]
+        print(f"{case:<16}" + "".join(f"{speed:>18.1f}" for speed in speeds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
@@ -3,7 +3,6 @@ import logging
 
 import rethinkdb as r
 from aiogram import Bot, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import Dispatcher
 from aiogram.types import ParseMode
 from aiogram.utils import executor, exceptions
@@ -12,25 +11,31 @@ from aiogram.utils.markdown import text, hbold, quote_html
 from aiogram.contrib.middlewares.logging import LoggingMiddleware
 
 from contrib.logging import create_logger
+from contrib.retry import supervise
+from contrib.search import SearchIndex, SearchResultsCache
+from contrib.fsm_storage import RethinkStorage
 from config import Config
-from models import User, Serial
+from models import User, Serial, FSMState
 
 
 loop = asyncio.get_event_loop()
 loop.run_until_complete(
     asyncio.gather(
         User.init_manager(Config.RDB),
-        Serial.init_manager(Config.RDB)
+        Serial.init_manager(Config.RDB),
+        FSMState.init_manager(Config.RDB)
     )
 )
 
 log = create_logger("bot")
 logging.getLogger("aiogram").setLevel(logging.INFO)
 
+serials_index = SearchIndex(**Config.SEARCH)
+Serial.enable_cache(**Config.MODEL_CACHE["serials"])
+
 bot = Bot(token=Config.BOT["token"], loop=loop)
 
-# For example use simple MemoryStorage for Dispatcher.
-storage = MemoryStorage()
+storage = RethinkStorage(**Config.BOT["storage"])
 dp = Dispatcher(bot, storage=storage)
 dp.middleware.setup(LoggingMiddleware())
 
@@ -47,26 +52,24 @@ async def callback_serials_page(callback_query: types.CallbackQuery):
     state = dp.current_state(chat=message.chat.id)
     data = await state.get_data()
     log.debug(f"Change page state: {data}")
-    page_number = data.get("page_number")
     search_query = data.get("search_query")
-    if not (page_number and search_query):
+    if not search_query:
         return await bot.answer_callback_query(callback_query.id)
 
     if callback_query.data.startswith("prev"):
-        if page_number > 1:
-            page_number -= 1
+        cursor = {"before": data.get("first_id")}
     elif callback_query.data.startswith("next"):
-        page_number += 1
+        cursor = {"after": data.get("last_id")}
     elif callback_query.data.startswith("start"):
-        page_number = 1
+        cursor = {}
     else:
         return await bot.answer_callback_query(callback_query.id)
 
-    serials_msg_data = await create_serials_message(search_query, page_number)
+    serials_msg_data, page_cursor = create_serials_message(search_query, position=data.get("position", 0), **cursor)
     try:
         await callback_query.message.edit_text(**serials_msg_data)
         await bot.answer_callback_query(callback_query.id)
-        await state.update_data(page_number=page_number)
+        await state.update_data(**page_cursor)
     except exceptions.MessageTextIsEmpty:
         await bot.answer_callback_query(callback_query.id, "Последняя страница")
 
@@ -81,7 +84,7 @@ async def choose_serial_and_voice(callback_query):
         log.debug(f"Serial id: {serial_id} voice: voice")
     except Exception:
         return await bot.answer_callback_query(callback_query.id, emojize("Что-то пошло не так:pensive:"))
-    serial = await Serial.manager.get(serial_id)
+    serial = await Serial.cached_get(serial_id)
     if not serial or serial and voice not in serial.get("voice", []):
         return await bot.answer_callback_query(message.chat.id, emojize("Упс! Сериал или озвучка не найдены:pensive:"))
 
@@ -111,17 +114,17 @@ async def create_subscription(user_id, serial, voice):
     serial_sub = {
         "id": serial["id"],
         "excluded_voices": [],
-        "title": serial["title"]
+        "title": serial["title"],
+        "voice": voice
     }
     await User.manager.execute(
-        User.manager.table.filter(
-            r.and_(
-                r.row["id"] == user_id,
-                r.not_(
-                    r.row["serials"].default([]).contains(serial_sub)
-                )
+        User.manager.table.get(user_id).update(
+            lambda user: r.branch(
+                user["serials"].default([])["id"].contains(serial_sub["id"]),
+                {},
+                {"serials": user["serials"].default([]).append(serial_sub)}
             )
-        ).update({"serials": r.row["serials"].default([]).append(serial_sub)})
+        )
     )
 
 
@@ -152,7 +155,7 @@ async def process_serial(message: types.Message):
         log.debug(f"Serial id {serial_id}")
     except Exception:
         return await bot.send_message(message.chat.id, emojize("Что-то пошло не так:pensive:"))
-    serial = await Serial.manager.get(serial_id)
+    serial = await Serial.cached_get(serial_id)
     if not serial:
         return await bot.send_message(message.chat.id, emojize("Упс! Сериал не найден:pensive:"))
 
@@ -255,13 +258,13 @@ async def process_name(message: types.Message):
         return await message.reply(emojize("Слишком мало символов:pensive:\nПопробуй ввести что-то другое:"))
 
     state = dp.current_state(chat=message.chat.id, user=message.from_user.id)
-    await state.update_data(search_query=message.text, page_number=1)
+    serials_msg_data, page_cursor = create_serials_message(message.text)
+    await state.update_data(search_query=message.text, **page_cursor)
 
     data = await state.get_data()
     log.debug(f"State: {data}")
 
     try:
-        serials_msg_data = await create_serials_message(message.text, 1)
         await bot.send_message(
             message.chat.id,
             **serials_msg_data
@@ -273,18 +276,27 @@ async def process_name(message: types.Message):
         )
 
 
-async def create_serials_message(search_query, page_number, limit=10):
-    res = await Serial.manager.execute(
-        Serial.manager.table
-        .order_by(r.desc("year"))\
-        .filter(
-            r.and_(
-                r.or_(
-                    r.row["year"].default(2019) >= 2017, r.row["finished"] == False),
-                    r.row["search_field"].match(search_query.lower())
-            )
-        )\
-        .slice(page_number * limit - limit, page_number * limit + 1)
+def is_actual_serial(serial):
+    return (serial.get("year") or 2019) >= 2017 or not serial.get("finished")
+
+
+search_results = SearchResultsCache(
+    serials_index,
+    max_queries=Config.SEARCH_RESULTS["max_queries"],
+    ttl=Config.SEARCH_RESULTS["ttl"],
+    predicate=is_actual_serial
+)
+
+
+def create_serials_message(search_query, after=None, before=None, position=0):
+    """
+    :param after: id of the last serial of previous page
+    :param before: id of the first serial of next page
+    :param position: start of the shown page, fallback for cursor ids
+    :return: message kwargs and page cursor for the state
+    """
+    res, has_prev, has_next, start = search_results.page(
+        search_query, Config.SEARCH_RESULTS["page_size"], after=after, before=before, position=position
     )
 
     log.debug(f"Create serial message page {res}")
@@ -302,17 +314,46 @@ async def create_serials_message(search_query, page_number, limit=10):
 
     inline_pagination = types.InlineKeyboardMarkup(row_width=2)
 
-    btn_row = [types.InlineKeyboardButton(">", callback_data="next_search_page")]
-    if page_number > 1:
-        btn_row.insert(0, types.InlineKeyboardButton("<", callback_data="prev_search_page"))
+    btn_row = []
+    if has_prev:
+        btn_row.append(types.InlineKeyboardButton("<", callback_data="prev_search_page"))
         inline_pagination.add(types.InlineKeyboardButton("В начало", callback_data="start_search_page"))
+    if has_next:
+        btn_row.append(types.InlineKeyboardButton(">", callback_data="next_search_page"))
     inline_pagination.add(*btn_row)
 
+    page_cursor = {
+        "first_id": res[0]["id"] if res else None,
+        "last_id": res[-1]["id"] if res else None,
+        "position": start
+    }
     return {
         "text": msg,
         "reply_markup": inline_pagination,
         "parse_mode": ParseMode.HTML
-    }
+    }, page_cursor
+
+
+async def watch_serials():
+    """
+    Load serials to search index, keep it and serials cache fresh with changefeed
+    :return:
+    """
+    changes = Serial.manager.iterate(Serial.manager.table.changes(include_initial=True, include_states=True))
+    async for change in changes:
+        serials_index.apply_change(change)
+        Serial.apply_cache_change(change)
+
+
+def reset_serials():
+    serials_index.reset()
+    if Serial.cache is not None:
+        Serial.cache.clear()
+
+
+async def startup(dispatcher: Dispatcher):
+    asyncio.ensure_future(supervise(watch_serials, "Serials changefeed", on_restart=reset_serials))
+    storage.start_prune()
 
 
 async def shutdown(dispatcher: Dispatcher):
@@ -321,4 +362,4 @@ async def shutdown(dispatcher: Dispatcher):
 
 
 if __name__ == '__main__':
-    executor.start_polling(dp, loop=loop, skip_updates=True, on_shutdown=shutdown)
+    executor.start_polling(dp, loop=loop, skip_updates=True, on_startup=startup, on_shutdown=shutdown)
@@ -1,11 +1,16 @@
+import time
 import asyncio
+from collections import Counter
 
 from aiogram import Bot
 from aiogram.utils import exceptions
 from aiogram.types import ParseMode
 
+from mq import create_queue
 from models import Message
 from contrib.logging import create_logger
+from contrib.rate_limit import TokenBucket, ChatRateLimiter
+from contrib.retry import RetryScheduler, backoff_delay, supervise
 from config import Config
 
 
@@ -23,16 +28,125 @@ class TelegramBroadcaster:
         self.loop = loop
         self.bot = Bot(token=config.BOT["token"], loop=loop)
         self.config = config
+        self.workers = config.BROADCAST["workers"]
+        self.queue = asyncio.Queue(maxsize=config.BROADCAST["queue_size"])
+        self.global_limiter = TokenBucket(config.BROADCAST["global_rate"])
+        self.chat_limiter = ChatRateLimiter(config.BROADCAST["chat_interval"])
+        self.retry_scheduler = RetryScheduler(self.queue)
+        self._slots = {}
+        self._in_flight = Counter()
+        self._mq_drained = asyncio.Event()
+        self.mq = create_queue(config.MQ, consumer=True)
 
     async def _run(self):
         """
-        Corountine which start process messages
+        Corountine which read messages feed or mq to the queue,
+        waits while queue is full. Feed messages already in flight are skipped after feed restart
         :return:
         """
-        async for message in Message.wrap_raw(self.messages_feed()):
-            if message:
+        if self.mq is not None:
+            return await self._consume_mq()
+
+        async for message in Message.iterate(self.messages_feed()):
+            if message and message.id not in self._in_flight:
                 self.logger.debug(f"New message {message}")
-                await self.process_message(message)
+                await self.enqueue(message)
+
+    async def _consume_mq(self):
+        while True:
+            envelopes = await self.mq.consume(self.config.MQ["batch_size"], self.config.MQ["consume_timeout"])
+            if not envelopes:
+                self._mq_drained.set()
+                continue
+            self._mq_drained.clear()
+            for envelope in envelopes:
+                self.logger.debug(f"New message {envelope}")
+                await self.enqueue(Message(**envelope.payload), envelope)
+
+    def track(self, message):
+        self._in_flight[message.id] += 1
+
+    def untrack(self, message):
+        self._in_flight[message.id] -= 1
+        if self._in_flight[message.id] <= 0:
+            del self._in_flight[message.id]
+
+    async def enqueue(self, message, envelope=None):
+        """
+        Put message to the queue, it's in flight until a worker is done with it
+        """
+        self.track(message)
+        await self.queue.put((message, envelope))
+
+    async def sweep_ready(self):
+        """
+        In mq mode READY messages aren't read from the feed,
+        pick up messages requeued after lease expiry and backlog left while the broker was down.
+        Sweep waits until mq backlog is consumed, messages in flight in this process are skipped
+        :return:
+        """
+        while True:
+            await self._mq_drained.wait()
+            await self.sweep_ready_once()
+            await asyncio.sleep(self.config.MQ["ready_sweep_interval"])
+
+    async def sweep_ready_once(self):
+        query = Message.manager.table.get_all(Message.Status.READY, index="status").filter(
+            Message._row["last_update"] < Message._r.now() - self.config.MQ["ready_sweep_grace"]
+        )
+        async for message in Message.iterate(query):
+            if message.id in self._in_flight:
+                continue
+            self.logger.debug(f"Sweep READY message {message}")
+            await self.enqueue(message)
+
+    async def _worker(self):
+        """
+        Corountine which send messages from the queue respecting rate limits,
+        mq envelopes are acked after message is processed
+        :return:
+        """
+        while True:
+            message, envelope = await self.queue.get()
+            postponed = False
+            try:
+                slot = self.reserve_chat_slot(message, envelope)
+                if slot is None:
+                    postponed = True
+                    continue
+                if await message.claim(self.config.BROADCAST["lease"]):
+                    await self.global_limiter.acquire()
+                    await self.process_message(message)
+                else:
+                    self.chat_limiter.release(message.recipient, slot)
+                    self.logger.debug(f"Message already claimed {message}")
+                if envelope is not None:
+                    await self.mq.ack([envelope])
+            except Exception:
+                self.logger.exception(f"Worker error on message {message}")
+                if envelope is not None:
+                    await self.mq.nack([envelope])
+            finally:
+                self.queue.task_done()
+                if not postponed:
+                    self.untrack(message)
+
+    def reserve_chat_slot(self, message, envelope):
+        """
+        Reserve message chat slot, message which slot is in the future
+        goes to retry scheduler instead of blocking the worker
+        :return: reserved slot, None if message is postponed
+        """
+        slot = self._slots.pop(id(message), None)
+        if slot is not None:
+            return slot
+        slot = self.chat_limiter.reserve_slot(message.recipient)
+        delay = slot - time.monotonic()
+        if delay <= 0:
+            return slot
+        self._slots[id(message)] = slot
+        self.retry_scheduler.schedule((message, envelope), time.time() + delay)
+        return None
 
     async def process_message(self, message):
         """
@@ -42,6 +156,11 @@ class TelegramBroadcaster:
         """
         try:
             error_message = await self.send_tlg_message(message.recipient, message.body)
+        except exceptions.RetryAfter as e:
+            self.logger.error(f"Target [ID:{message.recipient}]: Flood limit is exceeded. Retry in {e.timeout} seconds.")
+            return await self.retry_message(message, e.timeout)
+
+        try:
             if error_message:
                 message.error = error_message
                 message.status = Message.Status.ERROR
@@ -52,12 +171,46 @@ class TelegramBroadcaster:
         except exceptions.TelegramAPIError:
             self.logger.exception(f"Error on message {message}")
 
+    async def retry_message(self, message, timeout):
+        """
+        Persist attempt and schedule message retry,
+        only the message chat is delayed
+        :param message: Message
+        :param timeout: flood wait seconds
+        :return:
+        """
+        settings = self.config.BROADCAST
+        message.attempts = message.attempts + 1
+        if message.attempts >= settings["max_attempts"]:
+            message.status = Message.Status.ERROR
+            message.error = f"flood limit, {message.attempts} attempts"
+            return await message.save()
+
+        delay = max(timeout, backoff_delay(message.attempts, settings["retry_backoff"], settings["retry_max_delay"]))
+        self.chat_limiter.delay(message.recipient, delay)
+        message.not_before = time.time() + delay
+        message.status = Message.Status.RETRY
+        await message.save()
+        self.track(message)
+        self.retry_scheduler.schedule((message, None), message.not_before)
+
+    async def load_retries(self):
+        """
+        Schedule messages which wait for retry after restart
+        :return:
+        """
+        retries = Message.manager.table.get_all(Message.Status.RETRY, index="status")
+        async for message in Message.iterate(retries):
+            self.track(message)
+            self.retry_scheduler.schedule((message, None), message.not_before or 0)
+
     async def send_tlg_message(self, user_id, text, disable_notification=False):
         """
         Safe messages sender
         :param user_id: recipient id
         :param text: text to send
         :return: error string or None
+        :raises: exceptions.RetryAfter on flood limit
         """
         try:
             await self.bot.send_message(
@@ -70,10 +223,6 @@ class TelegramBroadcaster:
             msg = "user is deactivated"
         except exceptions.MessageTextIsEmpty:
             msg = "Msg is empty"
-        except exceptions.RetryAfter as e:
-            self.logger.error(f"Target [ID:{user_id}]: Flood limit is exceeded. Sleep {e.timeout} seconds.")
-            await asyncio.sleep(e.timeout)
-            return await self.send_tlg_message(user_id, text)  # Recursive call TODO: find something better
         else:
             self.logger.info(f"Target [ID:{user_id}]: success")
             return None
@@ -83,12 +232,12 @@ class TelegramBroadcaster:
 
     def messages_feed(self):
         """
-        Create rethinkdb changefeed generator
-        :return: generator
+        Create rethinkdb changefeed query
+        :return: rdb query
         """
-        return Message.manager.execute(
-            Message.manager.table.filter(Message._row["status"] == Message.Status.READY).changes()["new_val"]
-        )
+        return Message.manager.table.get_all(Message.Status.READY, index="status").changes(
+            include_initial=True
+        )["new_val"]
 
     def run(self):
         """
@@ -98,20 +247,29 @@ class TelegramBroadcaster:
         self.logger.info("Start messsage handler")
         try:
             self.loop.run_until_complete(
-                asyncio.gather(self._run(), self.refresh())
+                asyncio.gather(
+                    supervise(self._run, "Messages feed"),
+                    self.requeue_expired(),
+                    self.load_retries(),
+                    self.retry_scheduler.run(),
+                    *([self.sweep_ready()] if self.mq is not None else []),
+                    *[self._worker() for _ in range(self.workers)]
+                )
             )
         finally:
-            loop.close()
+            self.loop.close()
             self.logger.info("Finish messsage handler")
 
-    async def refresh(self):
+    async def requeue_expired(self):
+        """
+        Return messages with expired leases to the feed
+        :return:
+        """
         while True:
-            res = await Message.manager.execute(
-                Message.manager.table.filter(Message._row["status"] == Message.Status.READY).
-                    update({"last_update": Message._r.now()})
-            )
-            await asyncio.sleep(self.config.MESSAGE_REFRESH["sleep_between_refresh"])
-            self.logger.debug(f"Refresh messages res: {res}")
+            res = await Message.requeue_expired()
+            if res["replaced"]:
+                self.logger.info(f"Requeue expired messages: {res['replaced']}")
+            await asyncio.sleep(self.config.BROADCAST["lease_check_interval"])
 
 
 if __name__ == "__main__":
@@ -9,31 +9,144 @@ class Config:
         "db": os.environ.get("RDB_DB", "test")
     }
 
+    RDB_POOL = {
+        "min_size": 2,
+        "max_size": 10,
+        "health_check_interval": 30,
+        "health_check_timeout": 5,
+        "backoff": 0.1,
+        "max_backoff": 5
+    }
+
     DB_TABLES = {
         "serials": "serials",
         "messages": "messages",
         "users": "users",
-        "last_update_hash": "last_update_hash"
+        "seen_updates": "seen_updates",
+        "fsm_states": "fsm_states"
     }
 
     BOT = {
         "log_level": "DEBUG",
-        "token": os.environ["BOT_TOKEN"]
+        "token": os.environ["BOT_TOKEN"],
+        "storage": {
+            "ttl": 7 * 24 * 60 * 60,
+            "cache_size": 10000,
+            "cache_ttl": 60,
+            "prune_interval": 60 * 60
+        },
+        "webhook": {
+            "url": os.environ.get("WEBHOOK_URL"),
+            "path": os.environ.get("WEBHOOK_PATH", "/webhook"),
+            "host": os.environ.get("WEBHOOK_HOST", "0.0.0.0"),
+            "port": int(os.environ.get("WEBHOOK_PORT", 8443)),
+            "workers": os.cpu_count(),
+            "queue_size": 1000,
+            "shutdown_timeout": 10
+        }
+    }
+
+    SEARCH = {
+        "fields": ("title", "origin_title"),
+        "order_field": "year",
+        "min_similarity": 0.6
+    }
+
+    MODEL_CACHE = {
+        "serials": {
+            "maxsize": 10000,
+            "ttl": 10 * 60
+        }
+    }
+
+    SEARCH_RESULTS = {
+        "max_queries": 1000,
+        "ttl": 5 * 60,
+        "page_size": 10
     }
 
     PARSERS = {
         "base_url": os.environ.get("HDREZKA_BASE_URL", "http://hdrezka.ag"),
+        "engine": os.environ.get("PARSERS_ENGINE", "lxml"),
+        "parse_workers": os.cpu_count(),
+        "http": {
+            "shots": 5,
+            "timeout": 30,
+            "backoff": 0.5,
+            "max_backoff": 30,
+            "max_retry_after": 5 * 60,
+            "concurrency": {
+                "initial": 20,
+                "min_limit": 1,
+                "max_limit": 100,
+                "latency_target": 2.0
+            },
+            "connector": {
+                "limit": 100,
+                "limit_per_host": 100,
+                "keepalive_timeout": 30,
+                "ttl_dns_cache": 5 * 60,
+                "use_dns_cache": True
+            }
+        },
+        "http_cache": {
+            "max_entries": 1000,
+            "ttl": 60 * 60
+        },
         "serials": {
             "wait_time": 20 * 60,
+            "incremental": True,
+            "full_resync_interval": 24 * 60 * 60,
+            "unchanged_pages_to_stop": 1,
+            "pipeline": {
+                "fetchers": 50,
+                "parsers": os.cpu_count() * 2,
+                "urls_queue_size": 200,
+                "pages_queue_size": 50,
+                "serials_queue_size": 500,
+                "write_batch_size": 500,
+                "write_flush_interval": 5
+            },
             "log_level": "DEBUG"
         },
         "updates": {
             "wait_time": 10,
+            "seen_cache_size": 10000,
+            "seen_ttl": 30 * 24 * 60 * 60,
+            "seen_prune_interval": 60 * 60,
+            "history_path": os.environ.get("HDREZKA_UPDATES_HISTORY_PATH"),
+            "history_max_pages": 10,
+            "history_concurrency": 5,
+            "digest_window": 60,
+            "digest_max_items": 20,
             "log_level": "DEBUG"
         }
     }
 
-    MESSAGE_REFRESH = {
-        "sleep_between_refresh": 5,
-        "log_level": "DEBUG"
+    MQ = {
+        "backend": os.environ.get("MQ_BACKEND", "rethink"),
+        "batch_size": 100,
+        "consume_timeout": 1,
+        "ready_sweep_interval": 60,
+        "ready_sweep_grace": 60,
+        "file": {
+            "path": os.environ.get("MQ_PATH", "/tmp/hdrezka_mq"),
+            "poll_interval": 0.2
+        }
+    }
+
+    ADMIN = {
+        "page_size": 50
+    }
+
+    BROADCAST = {
+        "workers": 30,
+        "queue_size": 1000,
+        "global_rate": 30,
+        "chat_interval": 1,
+        "max_attempts": 5,
+        "retry_backoff": 1,
+        "retry_max_delay": 10 * 60,
+        "lease": 60,
+        "lease_check_interval": 30
     }
@@ -0,0 +1,87 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded mapping with optional per entry ttl (seconds)
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+class AsyncLRUCache(LRUCache):
+    """
+    LRU cache with async read-through,
+    concurrent misses of one key wait for the same load
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        super().__init__(maxsize, ttl)
+        self._loading = {}
+
+    async def get_or_load(self, key, load):
+        """
+        :param load: coroutine function returning value, None values aren't cached
+        :return: cached or loaded value
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        if key not in self._loading:
+            future = self._loading[key] = asyncio.get_event_loop().create_future()
+            asyncio.ensure_future(self._load(key, load, future))
+        return await asyncio.shield(self._loading[key])
+
+    async def _load(self, key, load, future):
+        try:
+            value = await load()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(value)
+            if self._loading.get(key) is future and value is not None:
+                self.set(key, value)
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def invalidate(self, key):
+        """
+        Drop value, value of load in progress won't be cached
+        """
+        self.pop(key)
+        self._loading.pop(key, None)
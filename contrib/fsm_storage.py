@@ -0,0 +1,116 @@
+import copy
+import asyncio
+
+import rethinkdb as r
+from aiogram.dispatcher.storage import BaseStorage
+
+from contrib.cache import LRUCache
+from contrib.logging import create_logger
+from models.fsm_state import FSMState
+
+
+log = create_logger("fsm_storage")
+
+
+class RethinkStorage(BaseStorage):
+    """
+    Dispatcher storage in `fsm_states` table, shared by bot processes and kept across restarts.
+    Records are cached locally and written through, `cache_ttl` bounds how long another
+    process's write may be unseen. Records expire after `ttl` seconds without writes
+    """
+    def __init__(self, ttl=7 * 24 * 60 * 60, cache_size=10000, cache_ttl=60, prune_interval=60 * 60):
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self._prune = None
+
+    @staticmethod
+    def _key(chat, user):
+        return f"{chat}:{user}"
+
+    @staticmethod
+    def _empty():
+        return {"state": None, "data": {}, "bucket": {}}
+
+    async def _get_record(self, chat, user):
+        chat, user = self.check_address(chat=chat, user=user)
+        key = self._key(chat, user)
+        record = self.cache.get(key)
+        if record is None:
+            raw = await FSMState.get_actual(key)
+            record = self._empty()
+            if raw:
+                record.update((field, raw[field]) for field in record if raw.get(field) is not None)
+            self.cache.set(key, record)
+        return key, record
+
+    async def _write(self, key, record):
+        self.cache.set(key, record)
+        if record == self._empty():
+            return await FSMState.manager.execute(FSMState.manager.table.get(key).delete())
+        state = FSMState(id=key, expires=r.now() + self.ttl, **record)
+        return await state.save(insert=True, conflict="replace")
+
+    async def _set_field(self, chat, user, field, value):
+        key, record = await self._get_record(chat, user)
+        await self._write(key, {**record, field: value})
+
+    async def get_state(self, *, chat=None, user=None, default=None):
+        _, record = await self._get_record(chat, user)
+        return record["state"] if record["state"] is not None else default
+
+    async def get_data(self, *, chat=None, user=None, default=None):
+        _, record = await self._get_record(chat, user)
+        return copy.deepcopy(record["data"] or default or {})
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        await self._set_field(chat, user, "state", state)
+
+    async def set_data(self, *, chat=None, user=None, data=None):
+        await self._set_field(chat, user, "data", copy.deepcopy(data or {}))
+
+    async def update_data(self, *, chat=None, user=None, data=None, **kwargs):
+        key, record = await self._get_record(chat, user)
+        await self._write(key, {**record, "data": {**record["data"], **copy.deepcopy({**(data or {}), **kwargs})}})
+
+    async def reset_state(self, *, chat=None, user=None, with_data=True):
+        key, record = await self._get_record(chat, user)
+        await self._write(key, {**record, "state": None, **({"data": {}} if with_data else {})})
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat=None, user=None, default=None):
+        _, record = await self._get_record(chat, user)
+        return copy.deepcopy(record["bucket"] or default or {})
+
+    async def set_bucket(self, *, chat=None, user=None, bucket=None):
+        await self._set_field(chat, user, "bucket", copy.deepcopy(bucket or {}))
+
+    async def update_bucket(self, *, chat=None, user=None, bucket=None, **kwargs):
+        key, record = await self._get_record(chat, user)
+        await self._write(key, {**record, "bucket": {**record["bucket"], **copy.deepcopy({**(bucket or {}), **kwargs})}})
+
+    async def reset_bucket(self, *, chat=None, user=None):
+        await self.set_bucket(chat=chat, user=user, bucket={})
+
+    def start_prune(self):
+        if self.prune_interval and self._prune is None:
+            self._prune = asyncio.ensure_future(self._prune_expired())
+
+    async def _prune_expired(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            try:
+                res = await FSMState.prune()
+                log.debug(f"Prune fsm states {res}")
+            except Exception:
+                log.exception("Prune fsm states error")
+
+    async def close(self):
+        if self._prune:
+            self._prune.cancel()
+        self.cache.clear()
+
+    async def wait_closed(self):
+        return True
@@ -0,0 +1,84 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    Global rate limiter: `rate` tokens per second, up to `capacity` burst
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Wait for a token, waiters are served in FIFO order
+        :return:
+        """
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class ChatRateLimiter:
+    """
+    Per chat limiter: one send per `interval` seconds for each chat.
+    Slots are reserved at call time, so sends to one chat keep their order
+    """
+    def __init__(self, interval, max_chats=10000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next_slot = {}
+
+    def reserve_slot(self, chat_id):
+        """
+        Reserve next chat slot
+        :return: monotonic time of the reserved slot
+        """
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, now))
+        self._next_slot[chat_id] = slot + self.interval
+        if len(self._next_slot) > self.max_chats:
+            self._prune(now)
+        return slot
+
+    def reserve(self, chat_id):
+        """
+        Reserve next chat slot
+        :return: seconds until the reserved slot, 0 if chat may send now
+        """
+        return max(0, self.reserve_slot(chat_id) - time.monotonic())
+
+    def release(self, chat_id, slot):
+        """
+        Give back reserved slot which wasn't used, only if no later slot of the chat is reserved
+        :param slot: value returned by `reserve_slot`
+        """
+        if self._next_slot.get(chat_id) == slot + self.interval:
+            self._next_slot[chat_id] = slot
+
+    async def wait(self, chat_id):
+        delay = self.reserve(chat_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def delay(self, chat_id, seconds):
+        """
+        Postpone next chat slot, e.g. on telegram flood wait
+        """
+        slot = time.monotonic() + seconds
+        self._next_slot[chat_id] = max(slot, self._next_slot.get(chat_id, slot))
+
+    def _prune(self, now):
+        self._next_slot = {chat_id: slot for chat_id, slot in self._next_slot.items() if slot > now}
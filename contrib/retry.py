@@ -0,0 +1,81 @@
+import time
+import heapq
+import asyncio
+import itertools
+
+from contrib.logging import create_logger
+
+
+log = create_logger("retry")
+
+def backoff_delay(attempt, base, cap=None):
+    """
+    Exponential backoff delay for `attempt` (starts from 1)
+    """
+    delay = base * 2 ** (attempt - 1)
+    return min(delay, cap) if cap else delay
+
+
+async def supervise(factory, name, on_restart=None, backoff=1, max_backoff=60):
+    """
+    Run coroutine made by `factory` until cancelled, restart it with backoff when it fails or ends.
+    Backoff starts over after a run longer than `max_backoff`
+    :param on_restart: optional callable called before each restart to reset stale state
+    """
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            await factory()
+            log.warning(f"{name} stopped")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception(f"{name} error")
+        attempt = 1 if time.monotonic() - started > max_backoff else attempt + 1
+        if on_restart:
+            on_restart()
+        await asyncio.sleep(backoff_delay(attempt, backoff, max_backoff))
+
+
+class RetryScheduler:
+    """
+    Heap of items keyed by not-before unix time,
+    due items are put to the `target` queue
+    """
+    def __init__(self, target):
+        self.target = target
+        self._heap = []
+        self._counter = itertools.count()
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, item, not_before):
+        """
+        :param item: any object
+        :param not_before: unix timestamp
+        :return:
+        """
+        heapq.heappush(self._heap, (not_before, next(self._counter), item))
+        self._changed.set()
+
+    async def run(self):
+        while True:
+            self._changed.clear()
+            if not self._heap:
+                await self._changed.wait()
+                continue
+
+            not_before, _, item = self._heap[0]
+            delay = not_before - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            await self.target.put(item)
@@ -0,0 +1,202 @@
+import re
+from collections import defaultdict
+
+from contrib.cache import LRUCache
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(value):
+    """
+    Lower case text, replace `ё` and drop punctuation
+    :param value: string or None
+    :return: normalized string
+    """
+    if not value:
+        return ""
+    return _NON_WORD.sub(" ", value.lower().replace("ё", "е")).strip()
+
+
+def trigrams(value, prefix=False):
+    """
+    Split normalized text to word trigrams padded with spaces.
+    With `prefix` words aren't padded from the right side,
+    so query `mor` also matches `morty`
+    :param value: normalized string
+    :param prefix: bool
+    :return: set of trigrams
+    """
+    grams = set()
+    for word in value.split():
+        padded = f"  {word}" if prefix else f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """
+    In-memory trigram inverted index.
+    Documents are plain dicts with `id` key,
+    results are ranked by trigram similarity, substring/prefix match and `order_field`
+    """
+    def __init__(self, fields=("title", "origin_title"), order_field="year", min_similarity=0.6):
+        self.fields = fields
+        self.order_field = order_field
+        self.min_similarity = min_similarity
+        self._docs = {}
+        self._texts = {}
+        self._titles = {}
+        self._grams = {}
+        self._postings = defaultdict(set)
+        self._stale = set()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def get(self, doc_id):
+        return self._docs.get(doc_id)
+
+    def add(self, doc):
+        """
+        Add or replace document
+        :param doc: dict with `id`
+        :return:
+        """
+        doc_id = doc["id"]
+        self.discard(doc_id)
+
+        texts = [normalize(doc.get(field)) for field in self.fields]
+        grams = set()
+        for value in texts:
+            grams |= trigrams(value)
+        for gram in grams:
+            self._postings[gram].add(doc_id)
+
+        self._docs[doc_id] = doc
+        self._texts[doc_id] = " ".join(texts)
+        self._titles[doc_id] = texts
+        self._grams[doc_id] = grams
+
+    def discard(self, doc_id):
+        self._stale.discard(doc_id)
+        grams = self._grams.pop(doc_id, None)
+        if grams is None:
+            return
+        for gram in grams:
+            posting = self._postings[gram]
+            posting.discard(doc_id)
+            if not posting:
+                del self._postings[gram]
+        del self._docs[doc_id]
+        del self._texts[doc_id]
+        del self._titles[doc_id]
+
+    def apply_change(self, change):
+        """
+        Apply rethinkdb changefeed item, `ready` state drops documents not reloaded after `reset`
+        :param change: dict with `old_val`/`new_val` or `state`
+        :return:
+        """
+        if change.get("state") == "ready":
+            for doc_id in list(self._stale):
+                self.discard(doc_id)
+            return
+        new_val = change.get("new_val")
+        old_val = change.get("old_val")
+        if new_val is not None:
+            self.add(new_val)
+        elif old_val is not None:
+            self.discard(old_val["id"])
+
+    def reset(self):
+        """
+        Start initial load over, documents not reloaded until `ready` state are dropped
+        """
+        self._stale = set(self._docs)
+
+    async def watch(self, changes):
+        """
+        Keep index fresh with changefeed
+        :param changes: async iterator of changefeed items
+        :return:
+        """
+        async for change in changes:
+            self.apply_change(change)
+
+    def search(self, query, predicate=None):
+        """
+        :param query: raw user query
+        :param predicate: optional callable(doc) -> bool
+        :return: list of ranked documents
+        """
+        query = normalize(query)
+        query_grams = trigrams(query, prefix=True)
+        if not query_grams:
+            return []
+
+        hits = defaultdict(int)
+        for gram in query_grams:
+            for doc_id in self._postings.get(gram, ()):
+                hits[doc_id] += 1
+
+        total = len(query_grams)
+        ranked = []
+        for doc_id, count in hits.items():
+            score = count / total
+            if query in self._texts[doc_id]:
+                score += 1
+                if any(title.startswith(query) for title in self._titles[doc_id]):
+                    score += 1
+            elif score < self.min_similarity:
+                continue
+
+            doc = self._docs[doc_id]
+            if predicate is not None and not predicate(doc):
+                continue
+            ranked.append((-score, -(doc.get(self.order_field) or 0), doc_id))
+
+        ranked.sort()
+        return [self._docs[doc_id] for _, _, doc_id in ranked]
+
+
+class SearchResultsCache:
+    """
+    Ranked result ids per normalized query, LRU bounded with ttl,
+    pages are taken by keyset cursor (id of first/last document of the shown page)
+    """
+    def __init__(self, index, max_queries=1000, ttl=5 * 60, predicate=None):
+        self.index = index
+        self.predicate = predicate
+        self.cache = LRUCache(max_queries, ttl)
+
+    def results(self, query):
+        """
+        :return: ranked ids and id -> position mapping
+        """
+        key = normalize(query)
+        results = self.cache.get(key)
+        if results is None:
+            ids = [doc["id"] for doc in self.index.search(key, predicate=self.predicate)]
+            results = ids, {doc_id: position for position, doc_id in enumerate(ids)}
+            self.cache.set(key, results)
+        return results
+
+    def page(self, query, limit=10, after=None, before=None, position=0):
+        """
+        :param after: id of the last document of previous page
+        :param before: id of the first document of next page
+        :param position: start of the shown page, used when cursor document left the results
+        :return: documents, has previous page, has next page, page start
+        """
+        ids, positions = self.results(query)
+        start = 0
+        if after is not None:
+            start = positions[after] + 1 if after in positions else position + limit
+        elif before is not None:
+            start = max(0, (positions[before] if before in positions else position) - limit)
+        docs = [self.index.get(doc_id) for doc_id in ids[start:start + limit]]
+        return [doc for doc in docs if doc is not None], start > 0, start + limit < len(ids), start
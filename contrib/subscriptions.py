@@ -0,0 +1,102 @@
+import asyncio
+from collections import defaultdict
+
+
+class SubscriptionIndex:
+    """
+    In-memory index of user subscriptions: serial id -> voice -> user ids.
+    `None` voice means subscription on any voice
+    """
+    def __init__(self):
+        self._index = defaultdict(lambda: defaultdict(set))
+        self._excluded = {}
+        self._users = {}
+        self._stale = set()
+        self.ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._users)
+
+    def add_user(self, user):
+        """
+        Add or replace user subscriptions
+        :param user: user document
+        :return:
+        """
+        user_id = user["id"]
+        self.discard_user(user_id)
+        if not user.get("is_active", True):
+            return
+
+        subscriptions = []
+        for sub in user.get("serials") or []:
+            voice = sub.get("voice")
+            self._index[sub["id"]][voice].add(user_id)
+            if sub.get("excluded_voices"):
+                self._excluded[(sub["id"], user_id)] = frozenset(sub["excluded_voices"])
+            subscriptions.append((sub["id"], voice))
+        if subscriptions:
+            self._users[user_id] = subscriptions
+
+    def discard_user(self, user_id):
+        self._stale.discard(user_id)
+        for serial_id, voice in self._users.pop(user_id, ()):
+            voices = self._index[serial_id]
+            voices[voice].discard(user_id)
+            if not voices[voice]:
+                del voices[voice]
+            if not voices:
+                del self._index[serial_id]
+            self._excluded.pop((serial_id, user_id), None)
+
+    def recipients(self, serial_id, voice=None):
+        """
+        :param serial_id: serial id
+        :param voice: update voice, None if unknown
+        :return: set of user ids
+        """
+        voices = self._index.get(serial_id)
+        if not voices:
+            return set()
+        if voice is None:
+            return set().union(*voices.values())
+
+        user_ids = voices.get(None, set()) | voices.get(voice, set())
+        return {
+            user_id for user_id in user_ids
+            if voice not in self._excluded.get((serial_id, user_id), ())
+        }
+
+    def apply_change(self, change):
+        """
+        Apply rethinkdb changefeed item, `ready` state marks initial load finished
+        :param change: dict with `old_val`/`new_val` or `state`
+        :return:
+        """
+        if change.get("state") == "ready":
+            for user_id in list(self._stale):
+                self.discard_user(user_id)
+            self.ready.set()
+            return
+        new_val = change.get("new_val")
+        old_val = change.get("old_val")
+        if new_val is not None:
+            self.add_user(new_val)
+        elif old_val is not None:
+            self.discard_user(old_val["id"])
+
+    def reset(self):
+        """
+        Start initial load over, e.g. after changefeed failure.
+        Index keeps serving, users not reloaded until `ready` state are dropped
+        """
+        self.ready.clear()
+        self._stale = set(self._users)
+
+    async def watch(self, changes):
+        """
+        :param changes: async iterator of changefeed items with `include_states`
+        :return:
+        """
+        async for change in changes:
+            self.apply_change(change)
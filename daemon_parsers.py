@@ -2,7 +2,7 @@ import asyncio
 
 from config import Config
 from parsers import SerialsParser, UpdateSerialParser
-from models import Serial, LastUpdateHash, User, init_models
+from models import init_models
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
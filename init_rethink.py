@@ -1,23 +1,20 @@
-import time
 import asyncio
 import logging
 import rethinkdb as r
 
 from models import all_models
+from models import pool
+from models.base import Index
 from contrib.logging import create_logger
 from config import Config
 
 logger = create_logger("rdb_init", logging.INFO)
 
 async def connect():
-    while True:
-        print("Connection...")
-        try:
-            rdb_connection = await r.connect(**Config.RDB)
-            break
-        except r.errors.ReqlDriverError as e:
-            print("Connection fail", e)
-        time.sleep(0.02)
+    print("Connection...")
+    rdb_connection = await pool.connect(
+        Config.RDB, backoff=Config.RDB_POOL["backoff"], max_backoff=Config.RDB_POOL["max_backoff"]
+    )
 
     db_name = Config.RDB["db"]
     if db_name not in await r.db_list().run(rdb_connection):
@@ -33,11 +30,13 @@ async def connect():
             await r.table_create(model.table_name).run(rdb_connection)
         logger.info(f"Table `{model.table_name}` inited")
 
-        indexes = await r.table(model.table_name).index_list().run(rdb_connection)
-        for model_index in model.indexes:
-            if model_index not in indexes:
-                await r.table(model.table_name).index_create(model_index).run(rdb_connection)
+        table = r.table(model.table_name)
+        indexes = await table.index_list().run(rdb_connection)
+        for model_index in map(Index.wrap, model.indexes):
+            if model_index.name not in indexes:
+                await model_index.create(table).run(rdb_connection)
             logger.info(f"index `{model_index}` of `{model.table_name}` inited")
+        await table.index_wait().run(rdb_connection)
     await rdb_connection.close()
     print("ReDB inited")
 
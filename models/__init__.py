@@ -1,11 +1,12 @@
 from .serial import Serial
 from .message import Message
 from .user import User
-from .last_update_hash import LastUpdateHash
+from .seen_update import SeenUpdate, SeenUpdatesStore
+from .fsm_state import FSMState
 
 
 all_models = [
-    Serial, Message, User, LastUpdateHash
+    Serial, Message, User, SeenUpdate, FSMState
 ]
 
 def init_models(config, loop):
@@ -4,9 +4,15 @@ import logging
 import rethinkdb as r
 
 from config import Config
+from models.pool import ConnectionPool
+from contrib.cache import AsyncLRUCache
+from contrib.logging import create_logger
 
 
 r.set_loop_type("asyncio")
+log = create_logger("models")
+# (model, field) pairs of already logged unknown fields
+_unknown_fields = set()
 
 
 async def rethink_iter(cursor):
@@ -15,45 +21,105 @@ async def rethink_iter(cursor):
         yield item
 
 
+class Index:
+    """
+    Secondary index declaration, `function` and `options` are passed to `index_create`
+    """
+    def __init__(self, name, function=None, **options):
+        self.name = name
+        self.function = function
+        self.options = options
+
+    @classmethod
+    def wrap(cls, index):
+        return index if isinstance(index, cls) else cls(index)
+
+    def create(self, table):
+        if self.function is None:
+            return table.index_create(self.name, **self.options)
+        return table.index_create(self.name, self.function, **self.options)
+
+    def __str__(self):
+        return self.name
+
+
 class ModelManager:
 
-    def __init__(self, table_name, rdb):
-        self.rdb = rdb
+    def __init__(self, table_name, pool):
+        self.pool = pool
         self.table = r.table(table_name)
 
     def __getattr__(self, attr):
-        attribute = self.table.__getattribute__(attr)
-
-        if not attribute:
-            return super().__getattribute__(attr)
+        """
+        Table method which runs query, bound once and cached in instance dict
+        """
+        attribute = getattr(self.table, attr)
 
         def __rdb_run_decorator(*args, **kwargs):
-            return attribute(*args, **kwargs).run(self.rdb)
+            return self.execute(attribute(*args, **kwargs))
 
+        self.__dict__[attr] = __rdb_run_decorator
         return __rdb_run_decorator
 
     async def all(self):
-        return await self.table.run(self.rdb)
+        return await self.execute(self.table)
 
     async def execute(self, query):
-        return await query.run(self.rdb)
+        async with self.pool.acquire() as conn:
+            return await query.run(conn)
 
-    @staticmethod
-    async def connect(config):
-        return await r.connect(**config)
+    async def iterate(self, query):
+        """
+        Run query and yield cursor items. The connection stays checked out until
+        the cursor is exhausted or closed, so streams and changefeeds
+        don't share it with other queries and the health check doesn't touch it
+        """
+        async with self.pool.acquire() as conn:
+            cursor = await query.run(conn)
+            try:
+                async for item in rethink_iter(cursor):
+                    yield item
+            finally:
+                cursor.close()
+
+    async def insert_many(self, docs, chunk_size=1000, **kwargs):
+        """
+        Insert documents by chunks, one query per chunk
+        :param docs: list of documents
+        :param chunk_size: documents per query
+        :param kwargs: rdb `insert` kwargs
+        :return: list of generated keys
+        """
+        keys = []
+        for start in range(0, len(docs), chunk_size):
+            res = await self.execute(self.table.insert(docs[start:start + chunk_size], **kwargs))
+            keys.extend(res.get("generated_keys", []))
+        return keys
 
     @classmethod
     async def create(cls, table_name, rdb_config):
-        rdb = await cls.connect(rdb_config)
-        return cls(table_name, rdb)
-
-    @classmethod
-    async def wrap_raw(cls, async_cursor):
-        async for raw in rethink_iter(await async_cursor):
-            yield raw
-
-
-class Model:
+        pool = await ConnectionPool.shared(rdb_config, **Config.RDB_POOL)
+        return cls(table_name, pool)
+
+
+class ModelMeta(type):
+    """
+    Store model fields in `__slots__` and precompile fields spec once per class
+    """
+    def __new__(mcs, name, bases, namespace):
+        fields = namespace.get("fields") or {}
+        inherited = {slot for base in bases for klass in base.__mro__ for slot in getattr(klass, "__slots__", ())}
+        namespace.setdefault("__slots__", tuple(field for field in fields if field not in inherited))
+        cls = super().__new__(mcs, name, bases, namespace)
+        cls._field_names = tuple(fields)
+        cls._field_set = frozenset(fields)
+        cls._required = tuple(field for field, (has_default, _) in fields.items() if not has_default)
+        cls._defaults = tuple((field, default) for field, (has_default, default) in fields.items() if has_default)
+        cls._default_values = dict(cls._defaults)
+        return cls
+
+
+class Model(metaclass=ModelMeta):
     REQUIRED_FIELD = (False, None)
     DEFAULT_VALUE = lambda value: (True, value)
 
@@ -67,63 +133,62 @@ class Model:
         class FieldMissed(ValidationError):
             pass
 
+    __slots__ = ("id",)
+
     table_name = None
     manager = None
     fields = None
     indexes = tuple()
     manager_class = ModelManager
+    cache = None
 
     _row = r.row
     _r = r
 
     def __init__(self, *args, **kwargs):
-        self._data = {}
-        self.id = kwargs.pop("id", None)
-
+        """
+        :param args: field values in `fields` order
+        :param kwargs: field values, unknown keys aren't stored and are logged once per model
+        """
         if self.manager is None:
-            if not "__manager__" in kwargs:
-                raise self.Exceptions.ManagerDoesNotInitializated("db manager is None")
-            else:
-                self.manager = kwargs.pop("__manager__")
+            raise self.Exceptions.ManagerDoesNotInitializated("db manager is None")
 
-        if args:
-            self._data = {key: value for key, value in zip(self.fields, args)}
+        self.id = kwargs.pop("id", None)
+        for field, value in zip(self._field_names, args):
+            setattr(self, field, value)
+        field_set = self._field_set
+        for field, value in kwargs.items():
+            if field in field_set:
+                setattr(self, field, value)
+            elif (type(self), field) not in _unknown_fields:
+                _unknown_fields.add((type(self), field))
+                log.debug(f"Ignore unknown field `{field}` of {type(self).__name__}")
 
-        if kwargs:
-            self._data = {
-                **self._data,
-                **kwargs
-            }
+    def __getattr__(self, attr):
+        # called only for not set slots
+        try:
+            return self._default_values[attr]
+        except KeyError:
+            raise AttributeError(attr) from None
 
     @property
     def cleaned_data(self):
-        self.validate()
-        if self.id is not None:
-            return {"id": self.id, **self._data}
-        return self._data
+        data = {} if self.id is None else {"id": self.id}
+        try:
+            for field in self._required:
+                data[field] = getattr(self, field)
+        except AttributeError:
+            raise self.Exceptions.FieldMissed(f"Provide `{field}` field name") from None
+        for field, default in self._defaults:
+            data[field] = getattr(self, field, default)
+        return data
 
     def validate(self):
-        data = {}
-        for field_name, field_data in self.fields.items():
-            has_default, default_value = field_data
-            if field_name in self._data:
-                data[field_name] = self._data[field_name]
-            elif has_default:
-                data[field_name] = default_value
-            else:
-                raise self.Exceptions.FieldMissed(f"Provide `{field_name}` field name")
-        self._data = data
-
-    def __setattr__(self, attr, value):
-        if attr in self.fields:
-            self._data[attr] = value
-        else:
-            super().__setattr__(attr, value)
-
-    def __getattr__(self, attr):
-        if attr in self.fields:
-            return self._data[attr]
-        return super().__getattribute__(attr)
+        """
+        Check required fields and set defaults of missed fields
+        """
+        for field, value in self.cleaned_data.items():
+            setattr(self, field, value)
 
     async def save(self, **kwargs):
         """
@@ -133,7 +198,9 @@ class Model:
         insert = kwargs.pop("insert", False)
         if not insert:
             if self.id:
-                return await self.manager.update(self.cleaned_data, **kwargs)
+                return await self.manager.execute(
+                    self.manager.table.get(self.id).update(self.cleaned_data, **kwargs)
+                )
 
         res = await self.manager.insert(self.cleaned_data, **kwargs)
         if self.id is None:
@@ -141,14 +208,62 @@ class Model:
         return res
 
     @classmethod
-    async def wrap_raw(cls, async_cursor):
-        async for raw in rethink_iter(await async_cursor):
+    async def bulk_save(cls, instances, **kwargs):
+        """
+        Insert many instances with few queries
+        :param instances: list of models
+        :param kwargs: `ModelManager.insert_many` kwargs
+        :return: list of generated keys
+        """
+        keys = await cls.manager.insert_many([instance.cleaned_data for instance in instances], **kwargs)
+        generated = iter(keys)
+        for instance in instances:
+            if instance.id is None:
+                instance.id = next(generated, None)
+        return keys
+
+    @classmethod
+    async def iterate(cls, query):
+        """
+        Stream query results as model instances, see `ModelManager.iterate`
+        """
+        async for raw in cls.manager.iterate(query):
             if raw is None:
                 yield None
                 continue
 
             yield cls(**raw)
 
+    @classmethod
+    def enable_cache(cls, maxsize=1024, ttl=None):
+        cls.cache = AsyncLRUCache(maxsize, ttl)
+
+    @classmethod
+    async def cached_get(cls, doc_id):
+        """
+        Read-through `manager.get`, plain `manager.get` without `enable_cache`.
+        Returned documents are shared, don't change them
+        :return: raw document or None
+        """
+        if cls.cache is None:
+            return await cls.manager.get(doc_id)
+        return await cls.cache.get_or_load(doc_id, lambda: cls.manager.get(doc_id))
+
+    @classmethod
+    def apply_cache_change(cls, change):
+        """
+        Refresh cached document with changefeed item
+        :param change: dict with `old_val`/`new_val`
+        :return:
+        """
+        doc = change.get("new_val") or change.get("old_val")
+        if cls.cache is None or not doc:
+            return
+        cached = doc["id"] in cls.cache
+        cls.cache.invalidate(doc["id"])
+        if cached and change.get("new_val"):
+            cls.cache.set(doc["id"], change["new_val"])
+
     @classmethod
     async def init_manager(cls, db_config):
         if cls.manager:
@@ -156,7 +271,8 @@ class Model:
         cls.manager = await cls.manager_class.create(cls.table_name, db_config)
 
     def __str__(self):
-        return f"<{type(self).__name__} ({self.id}): {','.join(f'{k}={v}' for k, v in self._data.items())}>"
+        values = ((field, getattr(self, field, None)) for field in self._field_names)
+        return f"<{type(self).__name__} ({self.id}): {','.join(f'{k}={v}' for k, v in values)}>"
 
 
 if __name__ == "__main__":
@@ -166,13 +282,14 @@ if __name__ == "__main__":
         "db": "test"
     }
 
-    async def main(loop):
-        Model.fields = {"data": Model.DEFAULT_VALUE(-1)}
-        Model.table_name = "x"
+    class X(Model):
+        table_name = "x"
+        fields = {"data": Model.DEFAULT_VALUE(-1)}
 
-        await Model.init_manager(config)
+    async def main(loop):
+        await X.init_manager(config)
 
-        async for m in Model.wrap_raw(Model.manager.all()):
+        async for m in X.iterate(X.manager.table):
             print(m)
 
 
@@ -0,0 +1,37 @@
+import rethinkdb as r
+
+from models.base import Model
+
+
+class FSMState(Model):
+    """
+    Bot dispatcher state of chat user, `id` is "<chat>:<user>"
+    """
+    table_name = "fsm_states"
+    indexes = ("expires",)
+
+    fields = {
+        "state": Model.DEFAULT_VALUE(None),
+        "data": Model.DEFAULT_VALUE({}),
+        "bucket": Model.DEFAULT_VALUE({}),
+        "expires": Model.REQUIRED_FIELD
+    }
+
+    @classmethod
+    async def get_actual(cls, state_id):
+        """
+        :return: not expired state document or None
+        """
+        return await cls.manager.execute(
+            cls.manager.table.get_all(state_id).filter(r.row["expires"] > r.now()).nth(0).default(None)
+        )
+
+    @classmethod
+    async def prune(cls):
+        """
+        Delete expired states
+        :return: rdb delete result
+        """
+        return await cls.manager.execute(
+            cls.manager.table.between(r.minval, r.now(), index="expires").delete()
+        )
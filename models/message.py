@@ -1,5 +1,5 @@
 import rethinkdb as r
-from models.base import Model
+from models.base import Model, Index
 
 
 class Message(Model):
@@ -8,17 +8,95 @@ class Message(Model):
         READY = "READY"
         DONE = "DONE"
         ERROR = "ERROR"
+        RETRY = "RETRY"
+        SENDING = "SENDING"
 
     table_name = "messages"
+    indexes = (
+        "status",
+        Index("status_lease", lambda message: [message["status"], message["lease_expires"]]),
+        Index("created_id", lambda message: [message["created"], message["id"]]),
+        Index("status_created_id", lambda message: [message["status"], message["created"], message["id"]]),
+        Index("recipient_created_id", lambda message: [message["recipient"], message["created"], message["id"]]),
+        Index(
+            "recipient_status_created_id",
+            lambda message: [message["recipient"], message["status"], message["created"], message["id"]]
+        ),
+    )
     fields = {
         "recipient": Model.REQUIRED_FIELD,
         "body": Model.REQUIRED_FIELD,
         "last_update": Model.DEFAULT_VALUE(r.now()),
         "created": Model.DEFAULT_VALUE(r.now()),
         "status":  Model.DEFAULT_VALUE(Status.READY),
-        "error": Model.DEFAULT_VALUE("")
+        "error": Model.DEFAULT_VALUE(""),
+        "attempts": Model.DEFAULT_VALUE(0),
+        "not_before": Model.DEFAULT_VALUE(None),
+        "lease_expires": Model.DEFAULT_VALUE(None)
     }
 
+    async def claim(self, lease):
+        """
+        Atomically move READY or RETRY message to SENDING,
+        claimed message is refreshed with stored document
+        :param lease: lease duration in seconds
+        :return: True if message is claimed by this call
+        """
+        res = await self.manager.execute(
+            self.manager.table.get(self.id).update(
+                lambda message: r.branch(
+                    r.expr([self.Status.READY, self.Status.RETRY]).contains(message["status"]),
+                    {"status": self.Status.SENDING, "lease_expires": r.now() + lease},
+                    {}
+                ),
+                return_changes=True
+            )
+        )
+        if res["replaced"] != 1:
+            return False
+        for key, value in res["changes"][0]["new_val"].items():
+            if key in self._field_set:
+                setattr(self, key, value)
+        return True
+
+    @classmethod
+    async def requeue_expired(cls):
+        """
+        Return SENDING messages with expired lease to READY
+        :return: rdb update result
+        """
+        return await cls.manager.execute(
+            cls.manager.table.between(
+                [cls.Status.SENDING, r.minval], [cls.Status.SENDING, r.now()], index="status_lease"
+            ).update({"status": cls.Status.READY, "lease_expires": None})
+        )
+
+    @classmethod
+    def page_query(cls, limit, status=None, recipient=None, since=None, until=None, before=None):
+        """
+        Newest first page of messages by keyset, cost doesn't depend on table size
+        :param limit: messages count
+        :param since: min `created` datetime
+        :param until: max `created` datetime, exclusive
+        :param before: (created, id) of the last message of previous page
+        :return: rdb query
+        """
+        if recipient is not None and status is not None:
+            index, prefix = "recipient_status_created_id", [recipient, status]
+        elif recipient is not None:
+            index, prefix = "recipient_created_id", [recipient]
+        elif status is not None:
+            index, prefix = "status_created_id", [status]
+        else:
+            index, prefix = "created_id", []
+
+        lower = prefix + [since if since is not None else r.minval, r.minval]
+        upper = prefix + [until if until is not None else r.maxval, r.minval]
+        if before is not None:
+            upper = prefix + list(before)
+
+        return cls.manager.table.between(lower, upper, index=index).order_by(index=r.desc(index)).limit(limit)
+
     async def save(self, **kwargs):
-        self._data["last_update"] = r.now()
+        self.last_update = r.now()
         return await super().save(**kwargs)
@@ -0,0 +1,149 @@
+import random
+import asyncio
+
+import rethinkdb as r
+
+from contrib.logging import create_logger
+
+
+log = create_logger("rdb_pool")
+
+
+async def connect(config, retries=None, backoff=0.1, max_backoff=5):
+    """
+    Connect to rethinkdb, reconnect with exponential backoff and jitter
+    :param config: `r.connect` kwargs
+    :param retries: attempts count, None - forever
+    :return: connection
+    """
+    attempt = 0
+    while True:
+        try:
+            return await r.connect(**config)
+        except r.errors.ReqlDriverError as e:
+            attempt += 1
+            if retries is not None and attempt >= retries:
+                raise
+            delay = min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1)
+            log.warning(f"Connection fail: {e}, retry in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class _PoolConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    async def __aenter__(self):
+        self.conn = await self.pool._acquire()
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.pool._release(self.conn)
+
+
+class ConnectionPool:
+    """
+    Sized pool of rethinkdb connections shared by model managers
+    """
+    _shared = {}
+
+    def __init__(self, config, min_size=1, max_size=10, health_check_interval=30, health_check_timeout=5,
+                 backoff=0.1, max_backoff=5):
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._idle = asyncio.Queue()
+        self._size = 0
+        self._health_check = None
+
+    @property
+    def size(self):
+        return self._size
+
+    @classmethod
+    async def shared(cls, config, **options):
+        """
+        One pool per connection config in process
+        """
+        key = tuple(sorted(config.items()))
+        if key not in cls._shared:
+            pool = cls._shared[key] = cls(config, **options)
+            await pool.start()
+        return cls._shared[key]
+
+    async def start(self):
+        while self._size < self.min_size:
+            await self._release(await self._connect())
+        if self.health_check_interval:
+            self._health_check = asyncio.ensure_future(self._check_health())
+
+    async def _connect(self):
+        self._size += 1
+        try:
+            return await connect(self.config, backoff=self.backoff, max_backoff=self.max_backoff)
+        except BaseException:
+            self._size -= 1
+            raise
+
+    async def _discard(self, conn):
+        self._size -= 1
+        try:
+            await conn.close(noreply_wait=False)
+        except (r.errors.ReqlDriverError, OSError):
+            pass
+
+    async def _release(self, conn):
+        if conn.is_open():
+            self._idle.put_nowait(conn)
+        else:
+            await self._discard(conn)
+
+    async def _acquire(self):
+        while True:
+            if self._idle.empty() and self._size < self.max_size:
+                return await self._connect()
+            conn = await self._idle.get()
+            if conn.is_open():
+                return conn
+            await self._discard(conn)
+
+    def acquire(self):
+        """
+        async with pool.acquire() as conn:
+            ...
+        """
+        return _PoolConnection(self)
+
+    async def _ping(self, conn):
+        """
+        Round trip to server, detects half-open sockets which `is_open` doesn't see
+        :return: True if connection answered in time
+        """
+        try:
+            return await asyncio.wait_for(r.expr(1).run(conn), self.health_check_timeout) == 1
+        except (r.errors.ReqlError, asyncio.TimeoutError, OSError):
+            return False
+
+    async def _check_health(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for _ in range(self._idle.qsize()):
+                conn = self._idle.get_nowait()
+                if conn.is_open() and await self._ping(conn):
+                    self._idle.put_nowait(conn)
+                else:
+                    log.warning("Discard broken connection")
+                    await self._discard(conn)
+            while self._size < self.min_size:
+                await self._release(await self._connect())
+
+    async def close(self):
+        if self._health_check:
+            self._health_check.cancel()
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
@@ -0,0 +1,78 @@
+import rethinkdb as r
+
+from models.base import Model
+from contrib.cache import LRUCache
+
+
+class SeenUpdate(Model):
+    """
+    Processed serial update, `id` is the update hash
+    """
+    table_name = "seen_updates"
+    indexes = ("created",)
+
+    fields = {
+        "created": Model.DEFAULT_VALUE(r.now())
+    }
+
+
+class SeenUpdatesStore:
+    """
+    Set of processed update hashes, LRU in memory in front of `seen_updates` table
+    """
+    legacy_table_name = "last_update_hash"
+
+    def __init__(self, cache_size=10000, ttl=30 * 24 * 60 * 60):
+        self.cache = LRUCache(cache_size)
+        self.ttl = ttl
+
+    async def filter_new(self, updates):
+        """
+        :param updates: list of update dicts
+        :return: not seen updates in the same order, without duplicates
+        """
+        unknown = list({update["hash"] for update in updates if update["hash"] not in self.cache})
+        if unknown:
+            seen = await SeenUpdate.manager.execute(
+                SeenUpdate.manager.table.get_all(*unknown)["id"].coerce_to("array")
+            )
+            for update_hash in seen:
+                self.cache.set(update_hash, True)
+
+        new_updates = []
+        taken = set()
+        for update in updates:
+            if update["hash"] in taken or update["hash"] in self.cache:
+                continue
+            taken.add(update["hash"])
+            new_updates.append(update)
+        return new_updates
+
+    async def is_empty(self):
+        return await SeenUpdate.manager.execute(SeenUpdate.manager.table.is_empty())
+
+    async def legacy_cursor(self):
+        """
+        :return: last processed update hash of the old single cursor table or None
+        """
+        return await SeenUpdate.manager.execute(
+            r.branch(
+                r.table_list().contains(self.legacy_table_name),
+                r.table(self.legacy_table_name).get(0)["hash"].default(None),
+                None
+            )
+        )
+
+    async def add(self, hashes):
+        await SeenUpdate.bulk_save([SeenUpdate(id=update_hash) for update_hash in hashes], conflict="update")
+        for update_hash in hashes:
+            self.cache.set(update_hash, True)
+
+    async def prune(self):
+        """
+        Delete hashes older than ttl
+        :return: rdb delete result
+        """
+        return await SeenUpdate.manager.execute(
+            SeenUpdate.manager.table.between(r.minval, r.now() - self.ttl, index="created").delete()
+        )
@@ -10,5 +10,7 @@ class Serial(Model):
         "title": Model.REQUIRED_FIELD,
         "origin_title": Model.REQUIRED_FIELD,
         "voice": Model.REQUIRED_FIELD,
-        "finished": Model.REQUIRED_FIELD
+        "finished": Model.REQUIRED_FIELD,
+        "fingerprint": Model.DEFAULT_VALUE(None),
+        "content_hash": Model.DEFAULT_VALUE(None)
     }
@@ -0,0 +1,85 @@
+import json
+import asyncio
+import hashlib
+from collections import Counter
+
+from contrib.logging import create_logger
+
+
+log = create_logger("batch_writer")
+
+
+class BatchWriter:
+    """
+    Buffered upsert of model documents, flushed by size or by `run` timer.
+    Documents with the same content hash as the stored one are skipped
+    """
+    def __init__(self, model, batch_size=200, flush_interval=5, conflict="update", hash_field="content_hash",
+                 on_write=None):
+        """
+        :param model: Model subclass with `hash_field` field
+        :param on_write: optional callable(docs) called after each written batch
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conflict = conflict
+        self.hash_field = hash_field
+        self.on_write = on_write
+        self.stats = Counter()
+        self._buffer = []
+        self._hashes = {}
+
+    def content_hash(self, doc):
+        content = {key: value for key, value in doc.items() if key != self.hash_field}
+        raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+    async def load_hashes(self):
+        async for raw in self.model.manager.iterate(self.model.manager.table.pluck("id", self.hash_field)):
+            self._hashes[raw["id"]] = raw.get(self.hash_field)
+
+    async def add(self, doc):
+        """
+        :param doc: document dict with `id`
+        :return: False if document is unchanged and skipped
+        """
+        doc = self.model(**doc).cleaned_data
+        digest = self.content_hash(doc)
+        if self._hashes.get(doc["id"]) == digest:
+            self.stats["skipped"] += 1
+            return False
+
+        doc[self.hash_field] = digest
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        return True
+
+    async def flush(self):
+        """
+        Write buffered documents, on error they are put back to the buffer for the next flush
+        """
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            await self.model.manager.insert_many(batch, chunk_size=self.batch_size, conflict=self.conflict)
+        except Exception:
+            self._buffer[:0] = batch
+            self.stats["write_errors"] += 1
+            raise
+        for doc in batch:
+            self._hashes[doc["id"]] = doc[self.hash_field]
+        self.stats["written"] += len(batch)
+        self.stats["write_queries"] += 1
+        if self.on_write:
+            self.on_write(batch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception(f"Flush {self.model.table_name} batch error")
@@ -0,0 +1,29 @@
+from .base import BaseQueue, Envelope
+from .memory import MemoryQueue
+from .file import FileQueue
+
+
+BACKENDS = {
+    "file": FileQueue
+}
+
+_queues = {}
+
+
+def create_queue(config, consumer=False):
+    """
+    Queue for parser -> broadcaster hand-off, one instance per backend and role in process.
+    `MemoryQueue` isn't selectable: parser and broadcaster run in separate processes
+    :param config: Config.MQ
+    :param consumer: open queue for consuming, producers only publish
+    :return: BaseQueue or None when messages are handed off via rethinkdb changefeed
+    """
+    backend = config["backend"]
+    if backend == "rethink":
+        return None
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown mq backend `{backend}`, use one of: rethink, {', '.join(BACKENDS)}")
+    key = (backend, consumer)
+    if key not in _queues:
+        _queues[key] = BACKENDS[backend](consumer=consumer, **config.get(backend, {}))
+    return _queues[key]
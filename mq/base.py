@@ -0,0 +1,41 @@
+class Envelope:
+    __slots__ = ("id", "payload")
+
+    def __init__(self, id, payload):
+        self.id = id
+        self.payload = payload
+
+    def __repr__(self):
+        return f"<Envelope ({self.id}): {self.payload}>"
+
+
+class BaseQueue:
+    """
+    At-least-once queue: consumed envelopes stay unacked
+    until `ack`, `nack` returns them to the queue
+    """
+
+    async def publish(self, payloads):
+        """
+        :param payloads: list of json serializable objects
+        :return:
+        """
+        raise NotImplementedError
+
+    async def consume(self, max_items, timeout=None):
+        """
+        Wait for envelopes
+        :param max_items: batch size
+        :param timeout: seconds to wait, None - forever
+        :return: list of Envelope, empty on timeout
+        """
+        raise NotImplementedError
+
+    async def ack(self, envelopes):
+        raise NotImplementedError
+
+    async def nack(self, envelopes):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+
+from .base import BaseQueue, Envelope
+
+
+class FileQueue(BaseQueue):
+    """
+    Local broker on top of append-only files, shared between processes.
+    Many producers, one consumer. Unacked envelopes are redelivered after restart.
+    Only the consumer reads and compacts the logs
+    """
+    MESSAGES = "messages.log"
+    ACKS = "acks.log"
+    LOCK = "lock"
+
+    def __init__(self, path, poll_interval=0.2, compact_size=1024 * 1024, consumer=False):
+        os.makedirs(path, exist_ok=True)
+        self.consumer = consumer
+        self.poll_interval = poll_interval
+        self.compact_size = compact_size
+        self._messages_path = os.path.join(path, self.MESSAGES)
+        self._acks_path = os.path.join(path, self.ACKS)
+        self._lock_path = os.path.join(path, self.LOCK)
+        self._offset = 0
+        self._pending = deque()
+        self._unacked = {}
+        if consumer:
+            self._load()
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_lines(path, offset=0):
+        """
+        :return: complete lines after offset and new offset
+        """
+        if not os.path.exists(path):
+            return [], offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return data[:end].decode("utf-8").splitlines(), offset + end
+
+    @staticmethod
+    def _append_lines(path, lines):
+        with open(path, "ab") as f:
+            f.write("".join(f"{line}\n" for line in lines).encode("utf-8"))
+
+    def _load(self):
+        with self._locked():
+            acked = set(self._read_lines(self._acks_path)[0])
+            lines, self._offset = self._read_lines(self._messages_path)
+            for line in lines:
+                raw = json.loads(line)
+                if raw["id"] not in acked:
+                    self._pending.append(Envelope(raw["id"], raw["payload"]))
+        self._compact()
+
+    def _read_new(self):
+        if os.path.exists(self._messages_path) and os.path.getsize(self._messages_path) < self._offset:
+            # truncated outside of this consumer, new lines start from the beginning
+            self._offset = 0
+        lines, self._offset = self._read_lines(self._messages_path, self._offset)
+        for line in lines:
+            raw = json.loads(line)
+            self._pending.append(Envelope(raw["id"], raw["payload"]))
+        return len(lines)
+
+    def _compact(self):
+        """
+        Truncate logs when everything written is acked
+        """
+        if self._pending or self._unacked or self._offset < self.compact_size:
+            return
+        with self._locked():
+            if not os.path.exists(self._messages_path) or os.path.getsize(self._messages_path) != self._offset:
+                return
+            open(self._messages_path, "wb").close()
+            open(self._acks_path, "wb").close()
+            self._offset = 0
+
+    def _publish(self, payloads):
+        lines = [json.dumps({"id": uuid.uuid4().hex, "payload": payload}) for payload in payloads]
+        with self._locked():
+            self._append_lines(self._messages_path, lines)
+
+    async def publish(self, payloads):
+        if payloads:
+            await asyncio.get_event_loop().run_in_executor(None, self._publish, payloads)
+
+    async def consume(self, max_items, timeout=None):
+        if not self.consumer:
+            raise RuntimeError("FileQueue is opened for publishing only")
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._pending:
+            if not await loop.run_in_executor(None, self._read_new):
+                self._compact()
+                if deadline is not None and time.monotonic() >= deadline:
+                    return []
+                await asyncio.sleep(self.poll_interval)
+
+        batch = []
+        while self._pending and len(batch) < max_items:
+            envelope = self._pending.popleft()
+            self._unacked[envelope.id] = envelope
+            batch.append(envelope)
+        return batch
+
+    async def ack(self, envelopes):
+        ids = [envelope.id for envelope in envelopes if self._unacked.pop(envelope.id, None) is not None]
+        if ids:
+            await asyncio.get_event_loop().run_in_executor(None, self._append_lines, self._acks_path, ids)
+
+    async def nack(self, envelopes):
+        for envelope in reversed(envelopes):
+            if self._unacked.pop(envelope.id, None) is not None:
+                self._pending.appendleft(envelope)
@@ -0,0 +1,50 @@
+import asyncio
+import itertools
+from collections import deque
+
+from .base import BaseQueue, Envelope
+
+
+class MemoryQueue(BaseQueue):
+    """
+    In-process queue, producer and consumer must share one event loop
+    """
+    def __init__(self):
+        self._items = deque()
+        self._unacked = {}
+        self._ids = itertools.count(1)
+        self._not_empty = asyncio.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    async def publish(self, payloads):
+        self._items.extend(Envelope(next(self._ids), payload) for payload in payloads)
+        if self._items:
+            self._not_empty.set()
+
+    async def consume(self, max_items, timeout=None):
+        if not self._items:
+            self._not_empty.clear()
+            try:
+                await asyncio.wait_for(self._not_empty.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+
+        batch = []
+        while self._items and len(batch) < max_items:
+            envelope = self._items.popleft()
+            self._unacked[envelope.id] = envelope
+            batch.append(envelope)
+        return batch
+
+    async def ack(self, envelopes):
+        for envelope in envelopes:
+            self._unacked.pop(envelope.id, None)
+
+    async def nack(self, envelopes):
+        for envelope in reversed(envelopes):
+            if self._unacked.pop(envelope.id, None) is not None:
+                self._items.appendleft(envelope)
+        if self._items:
+            self._not_empty.set()
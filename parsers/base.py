@@ -1,5 +1,8 @@
 # coding=utf-8
+import time
 import asyncio
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor
 
 import aiohttp
 from aiohttp.client_exceptions import (
@@ -8,17 +11,29 @@ from aiohttp.client_exceptions import (
 )
 
 from contrib.logging import create_logger
+from parsers.http_cache import HttpCache
+from parsers.concurrency import AdaptiveLimiter, backoff_with_jitter, parse_retry_after
+from parsers.extractors import parse_serial_id, get_engine
 
 log = create_logger("base_parser")
 
+# Returned by fetch with `skip_unchanged` when page body is the same as previous one
+NOT_MODIFIED = object()
+
+THROTTLE_STATUSES = (429, 503)
+
 
 class BaseParser:
 
     def __init__(self, config, loop=asyncio.get_event_loop(), session=None):
         self.base_url = f"{config.PARSERS['base_url']}/series/{{}}"
         self.loop = loop
-        self.session = self.get_client_session(session, self.loop)
-        self.semaphore = asyncio.Semaphore(100)
+        self.http_config = config.PARSERS["http"]
+        self.session = self.get_client_session(session, self.loop, self.http_config)
+        self.limiters = {}
+        self.http_cache = HttpCache(**config.PARSERS["http_cache"])
+        self.parse_executor = self.get_parse_executor(config.PARSERS["parse_workers"])
+        self.extractors = get_engine(config.PARSERS["engine"])
         self._run = True
 
     def is_run(self):
@@ -29,44 +44,92 @@ class BaseParser:
 
     async def after_work(self):
         await self.close_session()
+        if self.parse_executor:
+            self.parse_executor.shutdown(wait=False)
 
     async def close_session(self):
         if self.session and not self.session.closed:
             await self.session.close()
 
     @staticmethod
-    def get_client_session(session, loop):
+    def get_client_session(session, loop, http_config):
         async def _get_client_session():
-            return aiohttp.ClientSession()
+            return aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**http_config["connector"]),
+                timeout=aiohttp.ClientTimeout(total=http_config["timeout"])
+            )
 
         if session:
             return session
         return loop.run_until_complete(_get_client_session())
 
     @staticmethod
-    def parse_serial_id(url):
-        return int(url.rsplit("/", maxsplit=1)[1].split("-", maxsplit=1)[0])
+    def get_parse_executor(workers):
+        return ProcessPoolExecutor(workers) if workers else None
 
-    @staticmethod
-    async def _fetch(url, session, shots):
-        while shots:
-            try:
-                async with session.get(url) as resp:
-                    log.debug(f"{resp.status} {url}")
-                    if resp.status == 404:
-                        return None
-                    if resp.status != 200:
-                        raise ClientConnectionError
-                    return await resp.text()
-            except (ServerDisconnectedError, ClientConnectionError) as e:
-                log.exception("_fetch error")
-                await asyncio.sleep(0.5)
-                shots -= 1
+    parse_serial_id = staticmethod(parse_serial_id)
+
+    async def _parse(self, extractor, *args):
+        """
+        Run pure extractor function in parse executor, inline if executor is disabled
+        :param extractor: picklable function
+        :return: extractor result
+        """
+        if self.parse_executor is None:
+            return extractor(*args)
+        return await self.loop.run_in_executor(self.parse_executor, extractor, *args)
+
+    def get_limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveLimiter(**self.http_config["concurrency"])
+        return self.limiters[host]
+
+    async def _fetch(self, url, shots, skip_unchanged=False):
+        """
+        GET page with per host adaptive concurrency,
+        retries connection errors, 5xx and throttling with backoff
+        :return: body, None or NOT_MODIFIED
+        """
+        limiter = self.get_limiter(url)
+        for attempt in range(1, shots + 1):
+            retry_after = None
+            async with limiter:
+                start = time.monotonic()
+                try:
+                    headers = self.http_cache.conditional_headers(url)
+                    async with self.session.get(url, headers=headers) as resp:
+                        log.debug(f"{resp.status} {url}")
+                        if resp.status in THROTTLE_STATUSES:
+                            limiter.on_error()
+                            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                        elif resp.status >= 500:
+                            limiter.on_error()
+                        else:
+                            body = await resp.text()
+                            limiter.on_success(time.monotonic() - start)
+                            if resp.status == 304:
+                                return NOT_MODIFIED if skip_unchanged else self.http_cache.cached_body(url)
+                            if resp.status != 200:
+                                return None
+                            if self.http_cache.store(url, resp.headers, body) and skip_unchanged:
+                                return NOT_MODIFIED
+                            return body
+                except (ServerDisconnectedError, ClientConnectionError, asyncio.TimeoutError):
+                    log.exception("_fetch error")
+                    limiter.on_error()
+
+            if attempt < shots:
+                if retry_after is None:
+                    delay = backoff_with_jitter(attempt, self.http_config["backoff"], self.http_config["max_backoff"])
+                else:
+                    delay = min(retry_after, self.http_config["max_retry_after"])
+                log.debug(f"Retry {url} in {delay:.2f}s, concurrency limit {limiter.limit:.1f}")
+                await asyncio.sleep(delay)
         return None
 
-    async def _bound_fetch(self, url, shots=5):
-        async with self.semaphore:
-            return await self._fetch(url, self.session, shots)
+    async def _bound_fetch(self, url, shots=None, skip_unchanged=False):
+        return await self._fetch(url, shots or self.http_config["shots"], skip_unchanged)
 
     def fetch_data(self):
         self.loop.run_until_complete(self._fetch_data())
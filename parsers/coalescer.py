@@ -0,0 +1,92 @@
+import time
+import asyncio
+from collections import Counter
+
+from contrib.logging import create_logger
+
+log = create_logger("coalescer")
+
+
+class UpdateCoalescer:
+    """
+    Group notifications per recipient: pending lines are flushed as one digest
+    `window` seconds after the first one or when `max_items` lines are collected.
+    Lines may carry a key (e.g. update hash), `on_flushed` gets keys of which no line is pending anymore
+    """
+    def __init__(self, flush, window=60, max_items=20, on_flushed=None):
+        """
+        :param flush: coroutine function called with list of (recipient, lines)
+        :param on_flushed: optional coroutine function called with set of flushed keys
+        """
+        self.flush = flush
+        self.on_flushed = on_flushed
+        self.window = window
+        self.max_items = max_items
+        self._pending = {}
+        self._refs = Counter()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def is_pending(self, key):
+        return key in self._refs
+
+    def add(self, recipient, line, key=None):
+        if recipient not in self._pending:
+            self._pending[recipient] = (time.monotonic(), [], set())
+        _, lines, keys = self._pending[recipient]
+        lines.append(line)
+        if key is not None and key not in keys:
+            keys.add(key)
+            self._refs[key] += 1
+
+    def _restore(self, recipient, entry):
+        """
+        Put not flushed entry back before lines added meanwhile
+        """
+        started, lines, keys = entry
+        if recipient in self._pending:
+            _, new_lines, new_keys = self._pending[recipient]
+            lines = lines + new_lines
+            for key in keys & new_keys:
+                self._refs[key] -= 1
+            keys = keys | new_keys
+        self._pending[recipient] = (started, lines, keys)
+
+    async def flush_due(self, force=False):
+        """
+        Flush due digests, on `flush` error they stay pending and the error is raised
+        """
+        now = time.monotonic()
+        due = [
+            recipient for recipient, (started, lines, _) in self._pending.items()
+            if force or now - started >= self.window or len(lines) >= self.max_items
+        ]
+        if not due:
+            return
+
+        entries = [(recipient, self._pending.pop(recipient)) for recipient in due]
+        try:
+            await self.flush([(recipient, lines) for recipient, (_, lines, _) in entries])
+        except Exception:
+            for recipient, entry in entries:
+                self._restore(recipient, entry)
+            raise
+
+        flushed = set()
+        for _, (_, _, keys) in entries:
+            for key in keys:
+                self._refs[key] -= 1
+                if self._refs[key] <= 0:
+                    del self._refs[key]
+                    flushed.add(key)
+        if flushed and self.on_flushed:
+            await self.on_flushed(flushed)
+
+    async def run(self, interval=1):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_due()
+            except Exception:
+                log.exception("Flush digests error")
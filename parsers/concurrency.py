@@ -0,0 +1,77 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit.
+    Fast successful requests grow the limit by `increase` per `limit` requests,
+    errors, throttling and slow requests multiply it by `decrease`
+    (at most once per `latency_target` seconds)
+    """
+    def __init__(self, initial=20, min_limit=1, max_limit=100, latency_target=2.0, increase=1, decrease=0.5):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self._in_flight = 0
+        self._last_decrease = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency):
+        if latency > self.latency_target:
+            return self._decrease()
+        self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def on_error(self):
+        self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+
+
+def backoff_with_jitter(attempt, base, cap):
+    """
+    Exponential backoff with full jitter for `attempt` (starts from 1)
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def parse_retry_after(value):
+    """
+    :param value: Retry-After header, seconds or http date
+    :return: seconds or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
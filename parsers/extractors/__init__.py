@@ -0,0 +1,16 @@
+from .common import parse_serial_id, parse_serial_year
+from . import soup, xpath
+
+
+ENGINES = {
+    "soup": soup,
+    "lxml": xpath
+}
+
+
+def get_engine(name):
+    """
+    :param name: `soup` or `lxml`
+    :return: extractors module
+    """
+    return ENGINES[name]
@@ -0,0 +1,53 @@
+import hashlib
+
+
+def parse_serial_id(url):
+    return int(url.rsplit("/", maxsplit=1)[1].split("-", maxsplit=1)[0])
+
+
+def parse_serial_year(url):
+    try:
+        year = int(url.rsplit(".", maxsplit=1)[0].rsplit("-", maxsplit=1)[1])
+        return year if year >= 1900 else None
+    except Exception:
+        return None
+
+
+def fingerprint(text):
+    """
+    Hash of serial card text on listing page, it changes with new episodes
+    """
+    return hashlib.md5(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def build_serial(url, title, origin_title, voice, finished):
+    return {
+        "id": parse_serial_id(url),
+        "year": parse_serial_year(url),
+        "search_field": title.lower() + ((" " + origin_title.lower()) if origin_title else ""),
+        "title": title,
+        "origin_title": origin_title,
+        "voice": voice,
+        "finished": finished
+    }
+
+
+def build_update(url, name, season_text, episode_text):
+    _id = parse_serial_id(url)
+    season = season_text.replace("(", "").replace(" сезон)", "")
+    try:
+        episode, voice = episode_text.rsplit(" (", maxsplit=1)
+        voice = voice.replace(")", "")
+    except ValueError:
+        episode = episode_text
+        voice = None
+    episode = episode.replace(" серия", "")
+
+    return {
+        "serial_id": _id,
+        "name": name,
+        "season": season,
+        "episode": episode,
+        "voice": voice,
+        "hash": f"{_id}_{season}_{episode}_{voice}",
+    }
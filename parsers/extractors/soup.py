@@ -0,0 +1,50 @@
+"""
+BeautifulSoup extractors, pure functions for parse executor
+"""
+from bs4 import BeautifulSoup
+
+from parsers.extractors.common import fingerprint, build_serial, build_update
+
+
+def extract_serial_urls(raw_html):
+    """
+    :return: list of (serial url, listing fingerprint)
+    """
+    soup = BeautifulSoup(raw_html, "lxml")
+    return [
+        (item.select_one("div.b-content__inline_item-link > a")["href"], fingerprint(item.get_text(" ", strip=True)))
+        for item in soup.select("div.b-content__inline_item")
+    ]
+
+
+def extract_serial(raw_html, url):
+    """
+    :return: serial dict
+    """
+    soup = BeautifulSoup(raw_html, "lxml")
+    orig_name_tag = soup.find("div", class_="b-post__origtitle")
+    return build_serial(
+        url,
+        title=soup.find("h1", attrs={"itemprop": "name"}).get_text(),
+        origin_title=orig_name_tag.get_text() if orig_name_tag else None,
+        voice=[x.get_text() for x in soup.find_all("li", class_="b-translator__item")],
+        finished=bool(soup.find("div", class_="b-post__infolast"))
+    )
+
+
+def extract_updates(raw_html):
+    """
+    :return: list of update dicts from all day blocks, newest first
+    """
+    soup = BeautifulSoup(raw_html, "html.parser")
+    updates = []
+    for ul_element in soup.find_all("ul", class_="b-seriesupdate__block_list"):
+        for li_element in ul_element.find_all("li"):
+            a_element = li_element.find("a")
+            updates.append(build_update(
+                a_element["href"],
+                a_element.get_text(),
+                li_element.find("span").get_text(),
+                li_element.find("span", class_="cell-2").get_text()
+            ))
+    return updates
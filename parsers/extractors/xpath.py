@@ -0,0 +1,68 @@
+"""
+lxml extractors, XPath over lxml tree without soup objects
+"""
+from lxml import html
+
+from parsers.extractors.common import fingerprint, build_serial, build_update
+
+
+def _has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+LISTING_ITEMS = f'//div[{_has_class("b-content__inline_item")}]'
+LISTING_LINK = f'./div[{_has_class("b-content__inline_item-link")}]/a/@href'
+TITLE = '//h1[@itemprop="name"]'
+ORIGIN_TITLE = f'//div[{_has_class("b-post__origtitle")}]'
+VOICES = f'//li[{_has_class("b-translator__item")}]'
+FINISHED = f'boolean(//div[{_has_class("b-post__infolast")}])'
+UPDATES_LIST = f'//ul[{_has_class("b-seriesupdate__block_list")}]'
+UPDATE_EPISODE = f'.//span[{_has_class("cell-2")}]'
+
+
+def _text(element):
+    return "".join(element.xpath(".//text()"))
+
+
+def extract_serial_urls(raw_html):
+    """
+    :return: list of (serial url, listing fingerprint)
+    """
+    tree = html.fromstring(raw_html)
+    return [
+        (item.xpath(LISTING_LINK)[0], fingerprint(" ".join(item.xpath(".//text()"))))
+        for item in tree.xpath(LISTING_ITEMS)
+    ]
+
+
+def extract_serial(raw_html, url):
+    """
+    :return: serial dict
+    """
+    tree = html.fromstring(raw_html)
+    orig_name_tags = tree.xpath(ORIGIN_TITLE)
+    return build_serial(
+        url,
+        title=_text(tree.xpath(TITLE)[0]),
+        origin_title=_text(orig_name_tags[0]) if orig_name_tags else None,
+        voice=[_text(x) for x in tree.xpath(VOICES)],
+        finished=tree.xpath(FINISHED)
+    )
+
+
+def extract_updates(raw_html):
+    """
+    :return: list of update dicts from all day blocks, newest first
+    """
+    tree = html.fromstring(raw_html)
+    updates = []
+    for ul_element in tree.xpath(UPDATES_LIST):
+        for li_element in ul_element.iter("li"):
+            a_element = next(li_element.iter("a"))
+            updates.append(build_update(
+                a_element.get("href"),
+                _text(a_element),
+                _text(next(li_element.iter("span"))),
+                _text(li_element.xpath(UPDATE_EPISODE)[0])
+            ))
+    return updates
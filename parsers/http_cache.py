@@ -0,0 +1,54 @@
+import hashlib
+
+from contrib.cache import LRUCache
+
+
+class CacheEntry:
+    __slots__ = ("etag", "last_modified", "body_hash", "body")
+
+    def __init__(self, etag, last_modified, body_hash, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.body = body
+
+
+class HttpCache:
+    """
+    Validators and bodies of fetched pages.
+    Bodies are kept only for responses with ETag/Last-Modified, to answer 304
+    """
+    def __init__(self, max_entries=1000, ttl=60 * 60):
+        self._entries = LRUCache(max_entries, ttl)
+
+    def conditional_headers(self, url):
+        entry = self._entries.get(url)
+        headers = {}
+        if entry is None or entry.body is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def cached_body(self, url):
+        entry = self._entries.get(url)
+        return entry.body if entry else None
+
+    def store(self, url, headers, body):
+        """
+        :param url: page url
+        :param headers: response headers
+        :param body: response text
+        :return: True if body is the same as cached one
+        """
+        body_hash = hashlib.md5(body.encode("utf-8")).hexdigest()
+        previous = self._entries.get(url)
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        self._entries.set(
+            url,
+            CacheEntry(etag, last_modified, body_hash, body if etag or last_modified else None)
+        )
+        return previous is not None and previous.body_hash == body_hash
@@ -1,12 +1,15 @@
+import time
 import asyncio
 import logging
+from collections import Counter
 
 import rethinkdb as r
-from bs4 import BeautifulSoup
 
 from parsers.base import BaseParser
+from parsers.extractors import parse_serial_year
 from contrib.logging import create_logger
 from models.serial import Serial
+from models.writer import BatchWriter
 
 
 r.set_loop_type("asyncio")
@@ -17,78 +20,172 @@ class SerialsParser(BaseParser):
     def __init__(self, config, loop=asyncio.get_event_loop(), session=None):
         super().__init__(config, loop, session)
         self.wait_time = config.PARSERS["serials"]["wait_time"]
+        self.incremental = config.PARSERS["serials"]["incremental"]
+        self.full_resync_interval = config.PARSERS["serials"]["full_resync_interval"]
+        self.unchanged_pages_to_stop = config.PARSERS["serials"]["unchanged_pages_to_stop"]
+        self.pipeline = config.PARSERS["serials"]["pipeline"]
         self.logger = create_logger("serial_parser", config.PARSERS["serials"]["log_level"])
+        self.fingerprints = {}
+        self.last_full_sync = None
+        self.stats = Counter()
+        self.urls = self.pages = self.serials = None
+        self.writer = BatchWriter(
+            Serial,
+            batch_size=self.pipeline["write_batch_size"],
+            flush_interval=self.pipeline["write_flush_interval"],
+            on_write=self.on_serials_written
+        )
 
-    @staticmethod
-    def parse_serial_year(url):
-        try:
-            year = int(url.rsplit(".", maxsplit=1)[0].rsplit("-", maxsplit=1)[1])
-            return year if year >= 1900 else None
-        except Exception:
-            return None
+    parse_serial_year = staticmethod(parse_serial_year)
 
     async def fetch_serials_by_page(self, page_number):
+        """
+        :param page_number: listing page number
+        :return: list of (serial url, listing fingerprint)
+        """
         page_url = self.base_url.format(
            "" if page_number == 1 else f"page/{page_number}/"
         )
         raw_html = await self._bound_fetch(page_url)
         if raw_html is None:
             return None
-        soup = BeautifulSoup(raw_html, "lxml")
-        return [x["href"] for x in soup.select("div.b-content__inline_item-link > a")]
-
-    async def fetch_serial_data(self, serial_url):
-        id_ = self.parse_serial_id(serial_url)
-        year = self.parse_serial_year(serial_url)
-        raw_html = await self._bound_fetch(serial_url)
-        if raw_html is None:
-            return None
-
-        soup = BeautifulSoup(raw_html, "lxml")
-        orig_name_tag = soup.find("div", class_="b-post__origtitle")
-        title = soup.find("h1", attrs={"itemprop": "name"}).get_text()
-        origin_title = orig_name_tag.get_text() if orig_name_tag else None
-        search_field = title.lower() + ((" " + origin_title.lower()) if origin_title else "")
-        serial = Serial(
-            id=id_,
-            year=year,
-            search_field=search_field,
-            title=title,
-            origin_title=origin_title,
-            voice=[x.get_text() for x in soup.find_all("li", class_="b-translator__item")],
-            finished=bool(soup.find("div", class_="b-post__infolast"))
-        )
-        await serial.save(insert=True, conflict="update")
-        return serial
-
-    async def _fetch_data(self):
-        futures = []
+        return await self._parse(self.extractors.extract_serial_urls, raw_html)
+
+    async def load_fingerprints(self):
+        async for raw in Serial.manager.iterate(Serial.manager.table.pluck("id", "fingerprint")):
+            self.fingerprints[raw["id"]] = raw.get("fingerprint")
+        if self.fingerprints:
+            self.last_full_sync = time.monotonic()
+        self.logger.debug(f"Loaded fingerprints: {len(self.fingerprints)}")
+
+    def is_full_sync(self):
+        if not self.incremental or self.last_full_sync is None:
+            return True
+        return time.monotonic() - self.last_full_sync >= self.full_resync_interval
+
+    async def produce_serial_urls(self, full_sync):
+        """
+        Listing pages stage: put new/changed serials to `urls` queue
+        :param full_sync: put all serials and don't stop on unchanged pages
+        :return:
+        """
+        page = 1
+        unchanged_pages = 0
         while self.is_run():
-            page = 1
-            while True:
-                self.logger.debug(f"Fetch serials from page {page}")
-                serials_urls = await self.fetch_serials_by_page(page)
-                if not serials_urls:
-                    self.logger.debug("No serials on page")
+            self.logger.debug(f"Fetch serials from page {page}")
+            serials = await self.fetch_serials_by_page(page)
+            if not serials:
+                self.logger.debug("No serials on page")
+                break
+            self.stats["pages"] += 1
+
+            changed = [
+                (serial_url, fingerprint) for serial_url, fingerprint in serials
+                if self.fingerprints.get(self.parse_serial_id(serial_url)) != fingerprint
+            ]
+            if full_sync:
+                changed = serials
+            elif not changed:
+                unchanged_pages += 1
+                if unchanged_pages >= self.unchanged_pages_to_stop:
+                    self.logger.debug(f"Page {page} is unchanged, stop")
                     break
+            else:
+                unchanged_pages = 0
+
+            for serial in changed:
+                await self.urls.put(serial)
+            page += 1
+
+    async def fetch_worker(self):
+        """
+        Detail pages stage: `urls` -> `pages`
+        """
+        while True:
+            serial_url, fingerprint = await self.urls.get()
+            try:
+                raw_html = await self._bound_fetch(serial_url)
+                if raw_html is None:
+                    self.stats["fetch_failed"] += 1
+                else:
+                    self.stats["fetched"] += 1
+                    await self.pages.put((serial_url, fingerprint, raw_html))
+            except Exception:
+                self.logger.exception(f"Fetch {serial_url} error")
+            finally:
+                self.urls.task_done()
+
+    async def parse_worker(self):
+        """
+        Parse stage: `pages` -> `serials`
+        """
+        while True:
+            serial_url, fingerprint, raw_html = await self.pages.get()
+            try:
+                serial = await self._parse(self.extractors.extract_serial, raw_html, serial_url)
+                self.stats["parsed"] += 1
+                await self.serials.put({**serial, "fingerprint": fingerprint})
+            except Exception:
+                self.stats["parse_failed"] += 1
+                self.logger.exception(f"Parse {serial_url} error")
+            finally:
+                self.pages.task_done()
+
+    async def write_worker(self):
+        """
+        DB stage: `serials` -> batch writer
+        """
+        while True:
+            serial = await self.serials.get()
+            try:
+                await self.writer.add(serial)
+            except Exception:
+                self.logger.exception("Write serials error")
+            finally:
+                self.serials.task_done()
+
+    def on_serials_written(self, serials):
+        for serial in serials:
+            self.fingerprints[serial["id"]] = serial["fingerprint"]
+
+    def log_stats(self, elapsed):
+        stats = self.stats + self.writer.stats
+        rates = ", ".join(f"{stage}={count} ({count / elapsed:.1f}/s)" for stage, count in sorted(stats.items()))
+        self.logger.info(f"Sync finished in {elapsed:.1f}s: {rates}")
 
-                for serial_url in serials_urls:
-                    futures.append(
-                        asyncio.ensure_future(self.fetch_serial_data(serial_url))
-                    )
-
-                self.logger.debug(f"Tasks: {len(futures)}")
-                page += 1
-
-                if len(futures) > 50:
-                    self.logger.debug(f"Wait futures: {len(futures)}")
-                    await self.wait_futures(futures)
-
-
-            await self.wait_futures(futures)
-            await asyncio.sleep(self.wait_time)
-
-    @staticmethod
-    async def wait_futures(futures):
-        await asyncio.gather(*futures)
-        futures.clear()
+    async def _fetch_data(self):
+        self.urls = asyncio.Queue(maxsize=self.pipeline["urls_queue_size"])
+        self.pages = asyncio.Queue(maxsize=self.pipeline["pages_queue_size"])
+        self.serials = asyncio.Queue(maxsize=self.pipeline["serials_queue_size"])
+        workers = [
+            *[asyncio.ensure_future(self.fetch_worker()) for _ in range(self.pipeline["fetchers"])],
+            *[asyncio.ensure_future(self.parse_worker()) for _ in range(self.pipeline["parsers"])],
+            asyncio.ensure_future(self.write_worker()),
+            asyncio.ensure_future(self.writer.run())
+        ]
+
+        await self.load_fingerprints()
+        await self.writer.load_hashes()
+        try:
+            while self.is_run():
+                full_sync = self.is_full_sync()
+                self.logger.debug(f"Start {'full' if full_sync else 'incremental'} sync")
+                self.stats.clear()
+                self.writer.stats.clear()
+                started = time.monotonic()
+
+                await self.produce_serial_urls(full_sync)
+                for queue in (self.urls, self.pages, self.serials):
+                    await queue.join()
+                try:
+                    await self.writer.flush()
+                except Exception:
+                    self.logger.exception("Write serials error")
+
+                if full_sync:
+                    self.last_full_sync = time.monotonic()
+                self.log_stats(time.monotonic() - started)
+                await asyncio.sleep(self.wait_time)
+        finally:
+            for worker in workers:
+                worker.cancel()
@@ -1,117 +1,184 @@
+import time
 import asyncio
 
 import rethinkdb as r
-from bs4 import BeautifulSoup
 
-from models import Message, LastUpdateHash, User
-from parsers.base import BaseParser
-from contrib.mixins import RethinkConnectionMixin
+from mq import create_queue
+from models import Message, User, SeenUpdatesStore
+from parsers.base import BaseParser, NOT_MODIFIED
+from parsers.coalescer import UpdateCoalescer
 from contrib.logging import create_logger
+from contrib.retry import supervise
+from contrib.subscriptions import SubscriptionIndex
 
 r.set_loop_type("asyncio")
 log = create_logger("serials_update_parser")
 
 
-class UpdateSerialParser(RethinkConnectionMixin, BaseParser):
-    _hash = None
+class UpdateSerialParser(BaseParser):
 
     def __init__(self, config, loop=asyncio.get_event_loop(), session=None):
         super().__init__(config, loop, session)
         self.base_url = f"{config.PARSERS['base_url']}/"
         self.wait_time = config.PARSERS["updates"]["wait_time"]
+        self.mq = create_queue(config.MQ)
+        self.seen = SeenUpdatesStore(config.PARSERS["updates"]["seen_cache_size"], config.PARSERS["updates"]["seen_ttl"])
+        self.seen_prune_interval = config.PARSERS["updates"]["seen_prune_interval"]
+        self.subscriptions = SubscriptionIndex()
+        self.coalescer = UpdateCoalescer(
+            self.send_digests,
+            window=config.PARSERS["updates"]["digest_window"],
+            max_items=config.PARSERS["updates"]["digest_max_items"],
+            on_flushed=self.seen.add
+        )
+        self.last_prune = time.monotonic()
+        self.history_path = config.PARSERS["updates"]["history_path"]
+        self.history_max_pages = config.PARSERS["updates"]["history_max_pages"]
+        self.history_concurrency = config.PARSERS["updates"]["history_concurrency"]
 
     async def fetch_today_updates(self):
-        raw_html = await self._bound_fetch(self.base_url)
+        raw_html = await self._bound_fetch(self.base_url, skip_unchanged=True)
+        if raw_html is NOT_MODIFIED:
+            return []
         if not raw_html:
             return None
 
-        soup = BeautifulSoup(raw_html, "html.parser")
-
-        ul_element = soup.find("ul", class_="b-seriesupdate__block_list")
-        updates = []
-        for li_element in ul_element.find_all("li"):
-            a_element = li_element.find("a")
-            _id = self.parse_serial_id(a_element["href"])
-            season = li_element.find("span").get_text().replace("(", "").replace(" сезон)", "")
-            name = a_element.get_text()
-            try:
-                episode, voice = li_element.find("span", class_="cell-2").get_text().rsplit(" (", maxsplit=1)
-                voice = voice.replace(")", "")
-            except ValueError:
-                episode = li_element.find("span", class_="cell-2").get_text()
-                voice = None
-            episode = episode.replace(" серия", "")
-
-            update = {
-                "serial_id": _id,
-                "name": name,
-                "season": season,
-                "episode": episode,
-                "voice": voice,
-                "hash": f"{_id}_{season}_{episode}_{voice}",
-            }
-            updates.append(update)
-        return updates
+        return await self._parse(self.extractors.extract_updates, raw_html)
+
+    async def fetch_history_updates(self, page_number):
+        raw_html = await self._bound_fetch(f"{self.base_url}{self.history_path.format(page_number)}")
+        if not raw_html:
+            return None
+        return await self._parse(self.extractors.extract_updates, raw_html)
+
+    async def filter_new(self, updates):
+        """
+        :return: updates neither seen nor waiting in a pending digest
+        """
+        return [update for update in await self.seen.filter_new(updates) if not self.coalescer.is_pending(update["hash"])]
+
+    async def catch_up(self):
+        """
+        Fetch older update history pages concurrently, window by window,
+        until a page with already seen update, empty page or `history_max_pages`
+        :return: not seen updates, newest first
+        """
+        if not self.history_path:
+            return []
+
+        collected = []
+        page = 2
+        while page <= self.history_max_pages:
+            pages = range(page, min(page + self.history_concurrency, self.history_max_pages + 1))
+            log.debug(f"Catch up history pages {list(pages)}")
+            for updates in await asyncio.gather(*[self.fetch_history_updates(x) for x in pages]):
+                if not updates:
+                    return collected
+                new_updates = await self.filter_new(updates)
+                collected.extend(new_updates)
+                if len(new_updates) < len(updates):
+                    return collected
+            page = pages[-1] + 1
+        return collected
+
+    async def watch_subscriptions(self):
+        """
+        Load users subscriptions and keep them fresh with changefeed
+        :return:
+        """
+        changes = User.manager.iterate(
+            User.manager.table.pluck("id", "is_active", "serials").changes(include_initial=True, include_states=True)
+        )
+        await self.subscriptions.watch(changes)
 
     async def _fetch_data(self):
+        asyncio.ensure_future(
+            supervise(self.watch_subscriptions, "Subscriptions changefeed", on_restart=self.subscriptions.reset)
+        )
+        asyncio.ensure_future(self.coalescer.run())
+        await self.subscriptions.ready.wait()
+        log.debug(f"Subscriptions loaded: {len(self.subscriptions)} users")
+
+        bootstrap = await self.seen.is_empty()
+        catch_up = True
         while self.is_run():
             updates = await self.fetch_today_updates()
             log.debug(f"Updates raw {updates}")
-
-            last_update_hash = await self.get_last_update()
-            log.debug(f"Last update hash {last_update_hash}")
-            if last_update_hash:
-                index = [idx for idx, x in enumerate(updates) if x["hash"] == last_update_hash]
-                if index:
-                    updates = updates[:index[0]]
-
+            if not updates:
+                await asyncio.sleep(self.wait_time)
+                continue
+
+            if bootstrap:
+                new_updates = await self.bootstrap_seen(updates)
+            else:
+                new_updates = await self.filter_new(updates)
+                if catch_up or len(new_updates) == len(updates):
+                    new_updates = await self.filter_new(new_updates + await self.catch_up())
+            bootstrap = catch_up = False
+            updates = new_updates
             log.debug(f"Updates {updates}")
+            await self.subscriptions.ready.wait()
             for update in reversed(updates):
                 await self.process_update(update)
-                await self.set_last_update(update["hash"])
 
+            await self.prune_seen()
             log.debug("Wait")
             await asyncio.sleep(self.wait_time)
 
-    @classmethod
-    async def process_update(cls, update):
+    async def bootstrap_seen(self, updates):
+        """
+        First poll with empty seen updates: page updates are marked seen without notifications,
+        except ones newer than the legacy `last_update_hash` cursor if it is on the page
+        :return: updates to announce, newest first
+        """
+        legacy_hash = await self.seen.legacy_cursor()
+        hashes = [update["hash"] for update in updates]
+        new_updates = updates[:hashes.index(legacy_hash)] if legacy_hash in hashes else []
+        await self.seen.add(hashes[len(new_updates):])
+        log.info(f"Seen updates bootstrapped, {len(updates) - len(new_updates)} marked seen")
+        return new_updates
+
+    async def prune_seen(self):
+        if time.monotonic() - self.last_prune < self.seen_prune_interval:
+            return
+        self.last_prune = time.monotonic()
+        res = await self.seen.prune()
+        log.debug(f"Prune seen updates {res}")
+
+    async def process_update(self, update):
         text_msg = f'Вышла новая серия сериала "{update["name"]}"' \
                     f' {update["season"]} сезон {update["episode"]} серия {update["voice"] or ""}'
 
-        watchers = await cls.get_watchers_ids(update["serial_id"])
-        async for user_id in watchers:
-            message = Message(
-                recipient=user_id,
-                body=text_msg
-            )
-            await message.save()
-
-    @staticmethod
-    async def get_watchers_ids(serial_id):
-        return User.manager.wrap_raw(
-            User.manager.execute(
-                User.manager.table.filter(
-                    r.row["serials"].contains(
-                        lambda serial: serial["id"].eq(serial_id)
-                    )
-                )["id"]
-            )
-        )
-
-    @staticmethod
-    async def get_last_update():
+        recipients = self.subscriptions.recipients(update["serial_id"], update["voice"])
+        if not recipients:
+            await self.seen.add([update["hash"]])
+        for user_id in recipients:
+            self.coalescer.add(user_id, text_msg, key=update["hash"])
         try:
-            last_update = await LastUpdateHash.manager.get(0)
-            if not last_update:
-                return None
-            return last_update["hash"]
-        except r.errors.ReqlNonExistenceError:
-            return None
-
-    @staticmethod
-    async def set_last_update(hash):
-        log.debug(f"Set hash {hash}")
-        await LastUpdateHash(hash=hash, id=0).save(insert=True, conflict="update")
+            await self.coalescer.flush_due()
+        except Exception:
+            log.exception("Flush digests error, digests stay pending")
+
+    async def send_digests(self, digests):
+        """
+        Create one message per recipient
+        :param digests: list of (user id, notification lines)
+        :return:
+        """
+        messages = [Message(recipient=user_id, body="\n".join(lines)) for user_id, lines in digests]
+        await Message.bulk_save(messages)
+        if self.mq is None:
+            return
+        try:
+            await self.mq.publish([
+                {"id": message.id, "recipient": message.recipient, "body": message.body} for message in messages
+            ])
+        except Exception:
+            log.exception("Publish digests error, saved messages are left to the READY sweep")
+
+    async def after_work(self):
+        await self.coalescer.flush_due(force=True)
+        await super().after_work()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+import os
+
+
+os.environ.setdefault("BOT_TOKEN", "test")
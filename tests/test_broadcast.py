@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from broadcast import TelegramBroadcaster
+from mq.memory import MemoryQueue
+from models import Message
+from models.base import ModelManager
+from tests.utils import run
+
+
+class Config:
+    BOT = {"token": "123456789:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw"}
+    MQ = {"backend": "rethink", "batch_size": 10, "consume_timeout": 0.05, "ready_sweep_grace": 60}
+    BROADCAST = {
+        "workers": 1,
+        "queue_size": 100,
+        "global_rate": 30,
+        "chat_interval": 1,
+        "lease": 60
+    }
+
+
+class FakeMessage:
+    def __init__(self, message_id, recipient=1, claimable=True):
+        self.id = message_id
+        self.recipient = recipient
+        self.claimable = claimable
+
+    async def claim(self, lease):
+        return self.claimable
+
+
+class CountingBucket:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+
+
+def make_broadcaster():
+    broadcaster = TelegramBroadcaster(asyncio.get_event_loop(), Config)
+    broadcaster.global_limiter = CountingBucket()
+    broadcaster.sent = []
+
+    async def process_message(message):
+        broadcaster.sent.append(message.id)
+
+    broadcaster.process_message = process_message
+    return broadcaster
+
+
+async def drain(broadcaster, *items):
+    worker = asyncio.ensure_future(broadcaster._worker())
+    for message in items:
+        await broadcaster.enqueue(message)
+    await broadcaster.queue.join()
+    worker.cancel()
+    await broadcaster.bot.close()
+
+
+def test_unclaimed_copy_takes_no_tokens_and_releases_chat_slot():
+    async def scenario():
+        broadcaster = make_broadcaster()
+        await drain(broadcaster, FakeMessage("a", claimable=False))
+        return broadcaster, broadcaster.chat_limiter.reserve(1)
+
+    broadcaster, delay = run(scenario())
+    assert broadcaster.global_limiter.acquired == 0
+    assert broadcaster.sent == []
+    assert delay == 0
+
+
+def test_claimed_message_is_sent_with_global_token():
+    async def scenario():
+        broadcaster = make_broadcaster()
+        await drain(broadcaster, FakeMessage("a"), FakeMessage("b", recipient=2))
+        return broadcaster
+
+    broadcaster = run(scenario())
+    assert broadcaster.global_limiter.acquired == 2
+    assert broadcaster.sent == ["a", "b"]
+
+
+class FakeManager(ModelManager):
+    def __init__(self, docs):
+        super().__init__(Message.table_name, None)
+        self.docs = docs
+
+    async def iterate(self, query):
+        for doc in self.docs:
+            yield doc
+
+
+def test_sweep_skips_messages_in_flight(monkeypatch):
+    docs = [
+        {"id": "queued", "recipient": 1, "body": "a", "created": 0, "last_update": 0},
+        {"id": "lost", "recipient": 2, "body": "b", "created": 0, "last_update": 0}
+    ]
+    monkeypatch.setattr(Message, "manager", FakeManager(docs))
+
+    async def scenario():
+        broadcaster = make_broadcaster()
+        await broadcaster.enqueue(Message(**docs[0]))
+        await broadcaster.sweep_ready_once()
+        await broadcaster.sweep_ready_once()
+        await broadcaster.bot.close()
+        return [broadcaster.queue.get_nowait()[0].id for _ in range(broadcaster.queue.qsize())]
+
+    assert run(scenario()) == ["queued", "lost"]
+
+
+def test_mq_is_drained_after_backlog_is_consumed(monkeypatch):
+    monkeypatch.setattr(Message, "manager", FakeManager([]))
+
+    async def scenario():
+        broadcaster = make_broadcaster()
+        broadcaster.mq = MemoryQueue()
+        await broadcaster.mq.publish([{"id": str(n), "recipient": n, "body": "a"} for n in range(3)])
+        consumer = asyncio.ensure_future(broadcaster._consume_mq())
+        await asyncio.sleep(0.01)
+        backlog = broadcaster._mq_drained.is_set(), broadcaster.queue.qsize()
+        await asyncio.sleep(0.1)
+        consumer.cancel()
+        await broadcaster.bot.close()
+        return backlog, broadcaster._mq_drained.is_set(), dict(broadcaster._in_flight)
+
+    assert run(scenario()) == ((False, 3), True, {"0": 1, "1": 1, "2": 1})
@@ -0,0 +1,103 @@
+import time
+import asyncio
+
+import pytest
+
+from contrib.cache import LRUCache, AsyncLRUCache
+from models.serial import Serial
+from tests.utils import run
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+
+
+def test_lru_ttl_expires(monkeypatch):
+    cache = LRUCache(10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_concurrent_misses_share_one_load():
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    async def scenario():
+        cache = AsyncLRUCache()
+        values = await asyncio.gather(*[cache.get_or_load(1, load) for _ in range(3)])
+        return values, await cache.get_or_load(1, load)
+
+    values, cached = run(scenario())
+    assert values == [{"id": 1}] * 3
+    assert cached == {"id": 1}
+    assert len(loads) == 1
+
+
+def test_invalidate_during_load_skips_caching():
+    async def scenario():
+        cache = AsyncLRUCache()
+
+        async def load():
+            cache.invalidate(1)
+            return "stale"
+
+        value = await cache.get_or_load(1, load)
+        return value, 1 in cache
+
+    assert run(scenario()) == ("stale", False)
+
+
+def test_load_error_is_raised_and_not_cached():
+    async def scenario():
+        cache = AsyncLRUCache()
+
+        async def fail():
+            raise ConnectionError("rdb is down")
+
+        async def load():
+            return "fresh"
+
+        with pytest.raises(ConnectionError):
+            await cache.get_or_load(1, fail)
+        return await cache.get_or_load(1, load)
+
+    assert run(scenario()) == "fresh"
+
+
+class FakeManager:
+    async def get(self, doc_id):
+        return {"id": doc_id}
+
+
+def test_cached_get_without_cache_reads_manager(monkeypatch):
+    monkeypatch.setattr(Serial, "manager", FakeManager())
+    monkeypatch.setattr(Serial, "cache", None)
+    assert run(Serial.cached_get(5)) == {"id": 5}
+
+
+def test_cache_change_refreshes_cached_document(monkeypatch):
+    monkeypatch.setattr(Serial, "manager", FakeManager())
+    monkeypatch.setattr(Serial, "cache", None)
+    Serial.enable_cache(10)
+
+    async def scenario():
+        await Serial.cached_get(5)
+        Serial.apply_cache_change({"old_val": {"id": 5}, "new_val": {"id": 5, "title": "new"}})
+        Serial.apply_cache_change({"old_val": None, "new_val": {"id": 6}})
+        return await Serial.cached_get(5), 6 in Serial.cache
+
+    assert run(scenario()) == ({"id": 5, "title": "new"}, False)
@@ -0,0 +1,98 @@
+import pytest
+
+from parsers.coalescer import UpdateCoalescer
+from tests.utils import run
+
+
+class Sink:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.digests = []
+        self.flushed = []
+
+    async def flush(self, digests):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("rdb is down")
+        self.digests.extend(digests)
+
+    async def on_flushed(self, keys):
+        self.flushed.append(keys)
+
+
+def make_coalescer(sink, **kwargs):
+    return UpdateCoalescer(sink.flush, on_flushed=sink.on_flushed, **kwargs)
+
+
+def test_lines_are_grouped_until_window():
+    sink = Sink()
+    coalescer = make_coalescer(sink, window=60)
+
+    async def scenario():
+        coalescer.add(1, "a", key="h1")
+        coalescer.add(2, "a", key="h1")
+        coalescer.add(1, "b", key="h2")
+        await coalescer.flush_due()
+        pending = sink.digests[:]
+        await coalescer.flush_due(force=True)
+        return pending
+
+    assert run(scenario()) == []
+    assert sorted(sink.digests) == [(1, ["a", "b"]), (2, ["a"])]
+    assert sink.flushed == [{"h1", "h2"}]
+    assert not coalescer.is_pending("h1")
+
+
+def test_max_items_flushes_recipient_and_keeps_shared_keys_pending():
+    sink = Sink()
+    coalescer = make_coalescer(sink, window=60, max_items=2)
+
+    async def scenario():
+        coalescer.add(1, "a", key="h1")
+        coalescer.add(2, "a", key="h1")
+        coalescer.add(1, "b", key="h2")
+        await coalescer.flush_due()
+
+    run(scenario())
+    assert sink.digests == [(1, ["a", "b"])]
+    assert sink.flushed == [{"h2"}]
+    assert coalescer.is_pending("h1")
+    assert len(coalescer) == 1
+
+
+def test_failed_flush_keeps_entries():
+    sink = Sink(fail=1)
+    coalescer = make_coalescer(sink, window=60)
+
+    async def scenario():
+        coalescer.add(1, "a", key="h1")
+        with pytest.raises(ConnectionError):
+            await coalescer.flush_due(force=True)
+        coalescer.add(1, "b", key="h1")
+        await coalescer.flush_due(force=True)
+
+    run(scenario())
+    assert sink.digests == [(1, ["a", "b"])]
+    assert sink.flushed == [{"h1"}]
+    assert not coalescer.is_pending("h1")
+
+
+def test_lines_added_during_failed_flush_follow_restored_ones():
+    sink = Sink()
+    coalescer = make_coalescer(sink, window=60)
+
+    async def failing_flush(digests):
+        coalescer.add(1, "b", key="h1")
+        raise ConnectionError("rdb is down")
+
+    async def scenario():
+        coalescer.add(1, "a", key="h1")
+        coalescer.flush = failing_flush
+        with pytest.raises(ConnectionError):
+            await coalescer.flush_due(force=True)
+        coalescer.flush = sink.flush
+        await coalescer.flush_due(force=True)
+
+    run(scenario())
+    assert sink.digests == [(1, ["a", "b"])]
+    assert sink.flushed == [{"h1"}]
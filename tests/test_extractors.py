@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("bs4")
+pytest.importorskip("lxml")
+
+from benchmarks.parsers_bench import CASES, load_fixture
+from parsers.extractors import ENGINES
+
+
+@pytest.mark.parametrize("case, fixture, extractor, args", CASES, ids=[case[0] for case in CASES])
+def test_engines_extract_identical_results(case, fixture, extractor, args):
+    raw_html = load_fixture(fixture)
+    results = {name: getattr(engine, extractor)(raw_html, *args) for name, engine in ENGINES.items()}
+    reference = results.pop("soup")
+    assert reference
+    for name, result in results.items():
+        assert result == reference, name
@@ -0,0 +1,92 @@
+import pytest
+
+pytest.importorskip("aiogram")
+
+from contrib.fsm_storage import RethinkStorage
+from models.fsm_state import FSMState
+from tests.utils import run
+
+
+class FakeQuery:
+    def __init__(self, key):
+        self.key = key
+
+    def delete(self):
+        return self
+
+
+class FakeTable:
+    def get(self, key):
+        return FakeQuery(key)
+
+
+class FakeManager:
+    table = FakeTable()
+
+    def __init__(self):
+        self.records = {}
+        self.loads = []
+
+    async def execute(self, query):
+        self.records.pop(query.key, None)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = FakeManager()
+
+    async def get_actual(key):
+        manager.loads.append(key)
+        return manager.records.get(key)
+
+    async def save(self, **kwargs):
+        manager.records[self.id] = {"state": self.state, "data": self.data, "bucket": self.bucket}
+
+    monkeypatch.setattr(FSMState, "manager", manager, raising=False)
+    monkeypatch.setattr(FSMState, "get_actual", get_actual)
+    monkeypatch.setattr(FSMState, "save", save)
+    return manager
+
+
+def test_state_and_data_are_written_through(manager):
+    async def scenario():
+        storage = RethinkStorage()
+        await storage.set_state(chat=1, user=2, state="search")
+        await storage.update_data(chat=1, user=2, data={"query": "rick"}, page=1)
+        return await storage.get_state(chat=1, user=2), await storage.get_data(chat=1, user=2)
+
+    assert run(scenario()) == ("search", {"query": "rick", "page": 1})
+    assert manager.records["1:2"] == {"state": "search", "data": {"query": "rick", "page": 1}, "bucket": {}}
+    assert manager.loads == ["1:2"]
+
+
+def test_other_storage_reads_stored_record(manager):
+    async def scenario():
+        await RethinkStorage().set_data(chat=1, user=2, data={"query": "rick"})
+        other = RethinkStorage()
+        return await other.get_data(chat=1, user=2), await other.get_state(chat=1, user=2, default="none")
+
+    assert run(scenario()) == ({"query": "rick"}, "none")
+
+
+def test_returned_data_is_a_copy(manager):
+    async def scenario():
+        storage = RethinkStorage()
+        await storage.set_data(chat=1, user=2, data={"pages": [1]})
+        data = await storage.get_data(chat=1, user=2)
+        data["pages"].append(2)
+        return await storage.get_data(chat=1, user=2)
+
+    assert run(scenario()) == {"pages": [1]}
+
+
+def test_reset_deletes_empty_record(manager):
+    async def scenario():
+        storage = RethinkStorage()
+        await storage.set_state(chat=1, user=2, state="search")
+        await storage.set_data(chat=1, user=2, data={"query": "rick"})
+        await storage.reset_state(chat=1, user=2)
+        return await storage.get_state(chat=1, user=2)
+
+    assert run(scenario()) is None
+    assert manager.records == {}
@@ -0,0 +1,30 @@
+import pytest
+
+from models.base import ModelManager
+from models.message import Message
+
+
+@pytest.fixture(autouse=True)
+def manager(monkeypatch):
+    monkeypatch.setattr(Message, "manager", ModelManager(Message.table_name, None))
+
+
+def test_page_query_uses_compound_index_for_recipient_and_status():
+    query = str(Message.page_query(10, status="READY", recipient=7))
+    assert "between([7, 'READY', r.minval, r.minval], [7, 'READY', r.maxval, r.minval]" in query
+    assert "index='recipient_status_created_id'" in query
+    assert "filter" not in query
+
+
+@pytest.mark.parametrize("filters, index", [
+    ({}, "created_id"),
+    ({"status": "DONE"}, "status_created_id"),
+    ({"recipient": 7}, "recipient_created_id"),
+])
+def test_page_query_index_by_filters(filters, index):
+    assert f"index='{index}'" in str(Message.page_query(10, **filters))
+
+
+def test_page_query_continues_before_cursor():
+    query = str(Message.page_query(10, status="DONE", before=("created", "id")))
+    assert "['DONE', r.minval, r.minval], ['DONE', 'created', 'id']" in query
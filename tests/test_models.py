@@ -0,0 +1,75 @@
+import logging
+
+import pytest
+
+from models.base import Model, ModelManager
+
+
+class Item(Model):
+    table_name = "items"
+    manager = ModelManager(table_name, None)
+    fields = {
+        "title": Model.REQUIRED_FIELD,
+        "year": Model.REQUIRED_FIELD,
+        "status": Model.DEFAULT_VALUE("READY"),
+        "tags": Model.DEFAULT_VALUE(None)
+    }
+
+
+class Episode(Item):
+    fields = {
+        **Item.fields,
+        "episode": Model.DEFAULT_VALUE(1)
+    }
+
+
+def test_positional_args_and_kwargs():
+    item = Item("Rick and Morty", year=2013, id=5)
+    assert (item.id, item.title, item.year) == (5, "Rick and Morty", 2013)
+
+
+def test_defaults_are_read_until_set():
+    item = Item(title="Rick and Morty", year=2013)
+    assert item.status == "READY"
+    item.status = "DONE"
+    assert item.status == "DONE"
+    with pytest.raises(AttributeError):
+        item.missing
+
+
+def test_cleaned_data_with_and_without_id():
+    assert Item(title="a", year=1).cleaned_data == {"title": "a", "year": 1, "status": "READY", "tags": None}
+    assert Item(title="a", year=1, id=5, status="DONE").cleaned_data == {
+        "id": 5, "title": "a", "year": 1, "status": "DONE", "tags": None
+    }
+
+
+def test_missed_required_field():
+    with pytest.raises(Model.Exceptions.FieldMissed):
+        Item(title="a").cleaned_data
+
+
+def test_subclass_inherits_slots():
+    episode = Episode(title="a", year=1, episode=3)
+    assert Episode.__slots__ == ("episode",)
+    assert not hasattr(episode, "__dict__")
+    assert episode.cleaned_data == {"title": "a", "year": 1, "status": "READY", "tags": None, "episode": 3}
+
+
+def test_unknown_kwargs_are_logged_once_not_stored(caplog):
+    with caplog.at_level(logging.DEBUG, logger="models"):
+        item = Item(title="a", year=1, yaer=2)
+        Item(title="b", year=2, yaer=3)
+    assert "yaer" not in item.cleaned_data
+    assert caplog.text.count("Ignore unknown field `yaer` of Item") == 1
+    with pytest.raises(AttributeError):
+        item.yaer = 2
+
+
+def test_manager_is_required():
+    class Orphan(Model):
+        table_name = "orphans"
+        fields = {"title": Model.REQUIRED_FIELD}
+
+    with pytest.raises(Model.Exceptions.ManagerDoesNotInitializated):
+        Orphan(title="a")
@@ -0,0 +1,95 @@
+import pytest
+
+from mq import create_queue
+from mq.file import FileQueue
+from mq.memory import MemoryQueue
+from tests.utils import run
+
+
+def payloads(envelopes):
+    return [envelope.payload for envelope in envelopes]
+
+
+def test_file_queue_producer_restart_keeps_new_messages(tmp_path):
+    async def scenario():
+        producer = FileQueue(str(tmp_path), compact_size=0)
+        consumer = FileQueue(str(tmp_path), compact_size=0, consumer=True)
+        await producer.publish([{"n": n} for n in range(5)])
+        await consumer.ack(await consumer.consume(10, timeout=1))
+
+        producer = FileQueue(str(tmp_path), compact_size=0)
+        await producer.publish([{"n": 5}])
+        first = await consumer.consume(10, timeout=1)
+        await consumer.ack(first)
+        await producer.publish([{"n": 6}, {"n": 7}])
+        second = await consumer.consume(10, timeout=1)
+        return payloads(first), payloads(second)
+
+    assert run(scenario()) == ([{"n": 5}], [{"n": 6}, {"n": 7}])
+
+
+def test_file_queue_compacts_only_in_consumer(tmp_path):
+    async def scenario():
+        producer = FileQueue(str(tmp_path), compact_size=0)
+        consumer = FileQueue(str(tmp_path), compact_size=0, consumer=True)
+        await producer.publish([{"n": 1}])
+        await consumer.ack(await consumer.consume(10, timeout=1))
+        FileQueue(str(tmp_path), compact_size=0)
+        size_after_producer = (tmp_path / FileQueue.MESSAGES).stat().st_size
+        await consumer.consume(10, timeout=0)
+        return size_after_producer, (tmp_path / FileQueue.MESSAGES).stat().st_size
+
+    size_after_producer, size_after_consumer = run(scenario())
+    assert size_after_producer > 0
+    assert size_after_consumer == 0
+
+
+def test_file_queue_redelivers_unacked_after_consumer_restart(tmp_path):
+    async def scenario():
+        producer = FileQueue(str(tmp_path))
+        consumer = FileQueue(str(tmp_path), consumer=True)
+        await producer.publish([{"n": 1}, {"n": 2}])
+        first, second = await consumer.consume(10, timeout=1)
+        await consumer.ack([first])
+
+        restarted = FileQueue(str(tmp_path), consumer=True)
+        return payloads(await restarted.consume(10, timeout=1))
+
+    assert run(scenario()) == [{"n": 2}]
+
+
+def test_file_queue_nack_returns_envelopes_in_order(tmp_path):
+    async def scenario():
+        producer = FileQueue(str(tmp_path))
+        consumer = FileQueue(str(tmp_path), consumer=True)
+        await producer.publish([{"n": 1}, {"n": 2}, {"n": 3}])
+        batch = await consumer.consume(2, timeout=1)
+        await consumer.nack(batch)
+        return payloads(await consumer.consume(10, timeout=1))
+
+    assert run(scenario()) == [{"n": 1}, {"n": 2}, {"n": 3}]
+
+
+def test_file_queue_producer_cannot_consume(tmp_path):
+    with pytest.raises(RuntimeError):
+        run(FileQueue(str(tmp_path)).consume(1, timeout=0))
+
+
+def test_memory_queue_ack_nack_and_timeout():
+    async def scenario():
+        queue = MemoryQueue()
+        empty = await queue.consume(10, timeout=0.01)
+        await queue.publish(["a", "b"])
+        batch = await queue.consume(1)
+        await queue.nack(batch)
+        again = await queue.consume(10)
+        await queue.ack(again)
+        return empty, payloads(again), len(queue)
+
+    assert run(scenario()) == ([], ["a", "b"], 0)
+
+
+def test_create_queue_rejects_memory_backend():
+    assert create_queue({"backend": "rethink"}) is None
+    with pytest.raises(ValueError):
+        create_queue({"backend": "memory"})
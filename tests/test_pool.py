@@ -0,0 +1,89 @@
+import asyncio
+
+import rethinkdb as r
+
+from models.base import ModelManager
+from models.pool import ConnectionPool
+from tests.utils import run
+
+
+class FakeConnection:
+    def __init__(self, answers=True):
+        self.answers = answers
+        self.closed = False
+
+    def is_open(self):
+        return not self.closed
+
+    async def close(self, noreply_wait=True):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, items):
+        self.items = list(items)
+        self.closed = False
+
+    async def fetch_next(self):
+        return bool(self.items)
+
+    async def next(self):
+        return self.items.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeQuery:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def run(self, conn):
+        return self.cursor
+
+
+def make_pool(*connections, **options):
+    pool = ConnectionPool({}, min_size=0, **options)
+    for conn in connections:
+        pool._size += 1
+        pool._idle.put_nowait(conn)
+    return pool
+
+
+def test_iterate_keeps_connection_until_cursor_is_closed():
+    conn = FakeConnection()
+    pool = make_pool(conn)
+    manager = ModelManager("fakes", pool)
+    cursor = FakeCursor([1, 2, 3])
+
+    async def scenario():
+        items = manager.iterate(FakeQuery(cursor))
+        first = await items.__anext__()
+        idle_while_streaming = pool._idle.qsize()
+        await items.aclose()
+        return first, idle_while_streaming
+
+    assert run(scenario()) == (1, 0)
+    assert cursor.closed
+    assert pool._idle.get_nowait() is conn
+
+
+def test_health_check_discards_connections_which_dont_answer(monkeypatch):
+    good, silent = FakeConnection(), FakeConnection(answers=False)
+    pool = make_pool(good, silent, health_check_interval=0.01, health_check_timeout=0.05)
+
+    async def fake_run(query, conn, **kwargs):
+        if not conn.answers:
+            await asyncio.sleep(10)
+        return 1
+
+    monkeypatch.setattr(r.ast.RqlQuery, "run", fake_run)
+
+    async def scenario():
+        check = asyncio.ensure_future(pool._check_health())
+        await asyncio.sleep(0.2)
+        check.cancel()
+
+    run(scenario())
+    assert pool.size == 1
+    assert silent.closed and not good.closed
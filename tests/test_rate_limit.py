@@ -0,0 +1,50 @@
+import time
+
+from contrib.rate_limit import TokenBucket, ChatRateLimiter
+from tests.utils import run
+
+
+def test_token_bucket_limits_rate():
+    async def acquire_all():
+        bucket = TokenBucket(rate=50, capacity=5)
+        start = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # 5 burst tokens, 10 more at 50/s
+    assert run(acquire_all()) >= 0.18
+
+
+def test_chat_limiter_reserves_consecutive_slots():
+    limiter = ChatRateLimiter(interval=10)
+    assert limiter.reserve(1) == 0
+    assert 9 < limiter.reserve(1) <= 10
+    assert 19 < limiter.reserve(1) <= 20
+    assert limiter.reserve(2) == 0
+
+
+def test_chat_limiter_delay_postpones_only_that_chat():
+    limiter = ChatRateLimiter(interval=1)
+    limiter.delay(1, 600)
+    assert limiter.reserve(1) > 599
+    assert limiter.reserve(2) == 0
+
+
+def test_chat_limiter_prunes_expired_slots():
+    limiter = ChatRateLimiter(interval=0, max_chats=2)
+    for chat_id in range(10):
+        limiter.reserve(chat_id)
+    assert len(limiter._next_slot) <= 2
+
+
+def test_chat_limiter_release_gives_back_only_latest_slot():
+    limiter = ChatRateLimiter(interval=10)
+    first = limiter.reserve_slot(1)
+    limiter.reserve_slot(1)
+    limiter.release(1, first)
+    assert 19 < limiter.reserve(1) <= 20
+
+    limiter = ChatRateLimiter(interval=10)
+    limiter.release(1, limiter.reserve_slot(1))
+    assert limiter.reserve(1) == 0
@@ -0,0 +1,63 @@
+import time
+import asyncio
+
+from contrib.retry import RetryScheduler, backoff_delay, supervise
+from tests.utils import run
+
+
+def test_backoff_delay_grows_and_caps():
+    assert [backoff_delay(attempt, 1, 10) for attempt in range(1, 6)] == [1, 2, 4, 8, 10]
+    assert backoff_delay(3, 2) == 8
+
+
+def test_scheduler_puts_items_in_due_order():
+    async def scenario():
+        queue = asyncio.Queue()
+        scheduler = RetryScheduler(queue)
+        task = asyncio.ensure_future(scheduler.run())
+        now = time.time()
+        scheduler.schedule("late", now + 0.1)
+        scheduler.schedule("due", now - 1)
+        scheduler.schedule("soon", now + 0.05)
+        items = [await asyncio.wait_for(queue.get(), 1) for _ in range(3)]
+        task.cancel()
+        return items, len(scheduler)
+
+    assert run(scenario()) == (["due", "soon", "late"], 0)
+
+
+def test_scheduler_wakes_up_for_earlier_item():
+    async def scenario():
+        queue = asyncio.Queue()
+        scheduler = RetryScheduler(queue)
+        task = asyncio.ensure_future(scheduler.run())
+        scheduler.schedule("far", time.time() + 60)
+        await asyncio.sleep(0.01)
+        scheduler.schedule("now", time.time())
+        item = await asyncio.wait_for(queue.get(), 1)
+        task.cancel()
+        return item
+
+    assert run(scenario()) == "now"
+
+
+def test_supervise_restarts_failed_coroutine():
+    runs = []
+    restarts = []
+
+    async def flaky():
+        runs.append(len(runs))
+        if len(runs) < 3:
+            raise ConnectionError("changefeed lost")
+        await asyncio.sleep(60)
+
+    async def scenario():
+        task = asyncio.ensure_future(
+            supervise(flaky, "flaky", on_restart=lambda: restarts.append(1), backoff=0.01, max_backoff=1)
+        )
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    run(scenario())
+    assert runs == [0, 1, 2]
+    assert len(restarts) == 2
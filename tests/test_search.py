@@ -0,0 +1,82 @@
+from contrib.search import SearchIndex, SearchResultsCache, normalize
+
+
+SERIALS = [
+    {"id": 1, "title": "Рик и Морти", "origin_title": "Rick and Morty", "year": 2013},
+    {"id": 2, "title": "Мортал", "origin_title": "Mortal", "year": 2019},
+    {"id": 3, "title": "Ёлки", "origin_title": None, "year": 2010},
+]
+
+
+def make_index():
+    index = SearchIndex()
+    for serial in SERIALS:
+        index.add(serial)
+    return index
+
+
+def test_normalize():
+    assert normalize("Ёлки-палки!") == "елки палки"
+    assert normalize(None) == ""
+
+
+def test_search_ranks_prefix_and_substring_matches():
+    index = make_index()
+    assert [doc["id"] for doc in index.search("морт")] == [2, 1]
+    assert [doc["id"] for doc in index.search("rick")] == [1]
+    assert [doc["id"] for doc in index.search("елки")] == [3]
+    assert index.search("!!") == []
+
+
+def test_search_predicate_and_discard():
+    index = make_index()
+    assert [doc["id"] for doc in index.search("морт", predicate=lambda doc: doc["year"] < 2015)] == [1]
+    index.apply_change({"old_val": SERIALS[0], "new_val": None})
+    assert 1 not in index
+    assert [doc["id"] for doc in index.search("морт")] == [2]
+
+
+def test_reset_drops_documents_missing_from_reload():
+    index = make_index()
+    index.reset()
+    index.apply_change({"new_val": SERIALS[0]})
+    index.apply_change({"new_val": SERIALS[2]})
+    index.apply_change({"state": "ready"})
+
+    assert len(index) == 2
+    assert 2 not in index
+    assert [doc["id"] for doc in index.search("mortal")] == [1]
+
+
+def make_results(count=25):
+    index = SearchIndex()
+    for doc_id in range(count):
+        index.add({"id": doc_id, "title": f"Doctor {doc_id}", "year": 2000 + doc_id})
+    return index, SearchResultsCache(index, max_queries=10, ttl=60)
+
+
+def ids(docs):
+    return [doc["id"] for doc in docs]
+
+
+def test_results_pages_by_cursor():
+    _, results = make_results()
+    first, has_prev, has_next, start = results.page("doctor", limit=10)
+    assert (has_prev, has_next, start) == (False, True, 0)
+
+    second, has_prev, has_next, start = results.page("doctor", limit=10, after=first[-1]["id"])
+    assert (has_prev, has_next, start) == (True, True, 10)
+    assert not set(ids(first)) & set(ids(second))
+
+    back, _, _, start = results.page("doctor", limit=10, before=second[0]["id"])
+    assert (ids(back), start) == (ids(first), 0)
+
+
+def test_results_page_falls_back_to_position_when_cursor_is_gone():
+    _, results = make_results()
+    page, _, _, start = results.page("doctor", limit=10, after="gone", position=10)
+    assert start == 20
+    assert len(page) == 5
+
+    page, _, _, start = results.page("doctor", limit=10, before="gone", position=10)
+    assert start == 0
@@ -0,0 +1,50 @@
+from contrib.subscriptions import SubscriptionIndex
+
+
+def user(user_id, *serials, is_active=True):
+    return {"id": user_id, "is_active": is_active, "serials": list(serials)}
+
+
+def sub(serial_id, voice=None, excluded=()):
+    return {"id": serial_id, "voice": voice, "excluded_voices": list(excluded)}
+
+
+def test_recipients_by_voice():
+    index = SubscriptionIndex()
+    index.add_user(user(1, sub(10)))
+    index.add_user(user(2, sub(10, "LostFilm")))
+    index.add_user(user(3, sub(10, excluded=["Kubik"])))
+
+    assert index.recipients(10, "LostFilm") == {1, 2, 3}
+    assert index.recipients(10, "Kubik") == {1}
+    assert index.recipients(10) == {1, 2, 3}
+    assert index.recipients(11) == set()
+
+
+def test_changes_replace_and_remove_users():
+    index = SubscriptionIndex()
+    index.apply_change({"new_val": user(1, sub(10))})
+    index.apply_change({"old_val": user(1, sub(10)), "new_val": user(1, sub(11))})
+    index.apply_change({"new_val": user(2, sub(11), is_active=False)})
+
+    assert index.recipients(10) == set()
+    assert index.recipients(11) == {1}
+    index.apply_change({"old_val": user(1, sub(11)), "new_val": None})
+    assert index.recipients(11) == set()
+    assert len(index) == 0
+
+
+def test_reset_drops_users_missing_from_reload():
+    index = SubscriptionIndex()
+    index.apply_change({"new_val": user(1, sub(10))})
+    index.apply_change({"new_val": user(2, sub(10))})
+    index.apply_change({"state": "ready"})
+
+    index.reset()
+    assert not index.ready.is_set()
+    assert index.recipients(10) == {1, 2}
+    index.apply_change({"new_val": user(1, sub(10))})
+    index.apply_change({"state": "ready"})
+
+    assert index.ready.is_set()
+    assert index.recipients(10) == {1}
@@ -0,0 +1,52 @@
+import time
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from webhook import UpdatesIngest, update_chat_id
+from tests.utils import run
+
+
+class Config:
+    BOT = {"token": "test", "webhook": {"queue_size": 10, "workers": 1}}
+
+
+class SlowQueue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, data):
+        if not self.items and data["update_id"] == 1:
+            time.sleep(0.05)
+        self.items.append(data["update_id"])
+
+
+class Request:
+    def __init__(self, data):
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+
+def update(update_id, chat_id=7):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "from": {"id": 1}}}
+
+
+def test_update_chat_id():
+    assert update_chat_id(update(1, chat_id=-100)) == -100
+    assert update_chat_id({"update_id": 5, "callback_query": {"from": {"id": 3}}}) == 3
+    assert update_chat_id({"update_id": 5}) == 5
+
+
+def test_updates_of_chat_are_put_in_order():
+    ingest = UpdatesIngest(Config)
+    ingest.queues = [SlowQueue()]
+
+    async def scenario():
+        await asyncio.gather(*[ingest.handle(Request(update(update_id))) for update_id in range(1, 6)])
+
+    run(scenario())
+    assert ingest.queues[0].items == [1, 2, 3, 4, 5]
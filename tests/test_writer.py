@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from models.writer import BatchWriter
+from tests.utils import run
+
+
+class FakeManager:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.written = []
+
+    async def insert_many(self, docs, **kwargs):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("rdb is down")
+        self.written.append(list(docs))
+
+
+class FakeModel:
+    table_name = "fakes"
+    manager = None
+
+    def __init__(self, **doc):
+        self.cleaned_data = dict(doc)
+
+
+def make_writer(fail=0, **kwargs):
+    FakeModel.manager = FakeManager(fail)
+    return BatchWriter(FakeModel, **kwargs)
+
+
+def test_unchanged_documents_are_skipped():
+    async def scenario():
+        writer = make_writer(batch_size=10)
+        await writer.add({"id": 1, "title": "a"})
+        await writer.flush()
+        changed = await writer.add({"id": 1, "title": "b"})
+        unchanged = await writer.add({"id": 1, "title": "a", "content_hash": "stale"})
+        return writer, changed, unchanged
+
+    writer, changed, unchanged = run(scenario())
+    assert changed is True
+    assert unchanged is False
+    assert writer.stats["written"] == 1
+
+
+def test_failed_flush_keeps_batch():
+    async def scenario():
+        writer = make_writer(fail=1, batch_size=10)
+        await writer.add({"id": 1})
+        with pytest.raises(ConnectionError):
+            await writer.flush()
+        await writer.add({"id": 2})
+        await writer.flush()
+        return writer
+
+    writer = run(scenario())
+    assert FakeModel.manager.written == [[{"id": 1, "content_hash": writer.content_hash({"id": 1})},
+                                          {"id": 2, "content_hash": writer.content_hash({"id": 2})}]]
+    assert writer.stats["write_errors"] == 1
+    assert writer.stats["written"] == 2
+
+
+def test_run_survives_flush_error():
+    async def scenario():
+        writer = make_writer(fail=1, batch_size=10, flush_interval=0.01)
+        await writer.add({"id": 1})
+        task = asyncio.ensure_future(writer.run())
+        await asyncio.sleep(0.1)
+        alive = not task.done()
+        task.cancel()
+        return writer, alive
+
+    writer, alive = run(scenario())
+    assert alive
+    assert writer.stats["write_errors"] == 1
+    assert writer.stats["written"] == 1
@@ -0,0 +1,18 @@
+import asyncio
+
+
+def run(coro):
+    """
+    Run coroutine in a fresh event loop, tasks left running are cancelled
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        all_tasks = getattr(asyncio, "all_tasks", None) or asyncio.Task.all_tasks
+        pending = [task for task in all_tasks(loop) if not task.done()]
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
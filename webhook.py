@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from aiogram import Bot, types
+from aiogram.utils import context
+
+from contrib.logging import create_logger
+from config import Config
+
+
+log = create_logger("webhook")
+
+CHAT_UPDATES = ("message", "edited_message", "channel_post", "edited_channel_post")
+USER_UPDATES = ("callback_query", "inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query")
+
+
+def update_chat_id(data):
+    """
+    :param data: raw telegram update
+    :return: chat (or user) id the update belongs to, update id if there is none
+    """
+    for kind in CHAT_UPDATES:
+        if kind in data:
+            return data[kind]["chat"]["id"]
+    for kind in USER_UPDATES:
+        if kind in data:
+            message = data[kind].get("message")
+            return message["chat"]["id"] if message else data[kind]["from"]["id"]
+    return data.get("update_id", 0)
+
+
+class UpdateWorker:
+    """
+    Process updates of worker's chats with bot dispatcher,
+    updates of one chat one by one in order of arrival, different chats concurrently
+    """
+    def __init__(self, dp, updates):
+        self.dp = dp
+        self.updates = updates
+        self.chats = {}
+        self.tasks = set()
+
+    async def run(self):
+        context.set_value("dispatcher", self.dp)
+        context.set_value("bot", self.dp.bot)
+        loop = asyncio.get_event_loop()
+        while True:
+            data = await loop.run_in_executor(None, self.updates.get)
+            if data is None:
+                break
+            chat_id = update_chat_id(data)
+            if chat_id in self.chats:
+                self.chats[chat_id].append(data)
+            else:
+                self.chats[chat_id] = deque([data])
+                task = asyncio.ensure_future(self.process_chat(chat_id))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+
+    async def process_chat(self, chat_id):
+        pending = self.chats[chat_id]
+        while pending:
+            data = pending[0]
+            try:
+                await self.dp.process_update(types.Update.to_object(data))
+            except Exception:
+                log.exception(f"Process update {data.get('update_id')} error")
+            pending.popleft()
+        del self.chats[chat_id]
+
+
+def run_worker(updates):
+    """
+    Worker process entry point, bot handlers are imported here to get own db connections
+    """
+    import bot
+
+    bot.loop.set_task_factory(context.task_factory)
+    bot.loop.run_until_complete(bot.startup(bot.dp))
+    try:
+        bot.loop.run_until_complete(UpdateWorker(bot.dp, updates).run())
+    finally:
+        bot.loop.run_until_complete(bot.shutdown(bot.dp))
+
+
+class UpdatesIngest:
+    """
+    Accept webhook requests and route updates to worker processes by chat id
+    """
+    def __init__(self, config):
+        self.config = config.BOT["webhook"]
+        self.token = config.BOT["token"]
+        mp = multiprocessing.get_context("spawn")
+        self.queues = [mp.Queue(self.config["queue_size"]) for _ in range(self.config["workers"])]
+        self.processes = [mp.Process(target=run_worker, args=(queue,), daemon=True) for queue in self.queues]
+        # one writer thread per queue keeps puts of a chat in order of arrival
+        self.writers = [ThreadPoolExecutor(max_workers=1) for _ in self.queues]
+
+    async def put(self, index, data):
+        await asyncio.get_event_loop().run_in_executor(self.writers[index], self.queues[index].put, data)
+
+    async def handle(self, request):
+        data = await request.json()
+        await self.put(hash(update_chat_id(data)) % len(self.queues), data)
+        return web.Response(text="ok")
+
+    async def on_startup(self, app):
+        for process in self.processes:
+            process.start()
+        if self.config["url"]:
+            bot = Bot(token=self.token)
+            await bot.set_webhook(self.config["url"] + self.config["path"])
+            await bot.close()
+
+    async def on_shutdown(self, app):
+        await asyncio.gather(*[self.put(index, None) for index in range(len(self.queues))])
+        for writer in self.writers:
+            writer.shutdown()
+        for process in self.processes:
+            process.join(self.config["shutdown_timeout"])
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post(self.config["path"], self.handle)
+        app.on_startup.append(self.on_startup)
+        app.on_shutdown.append(self.on_shutdown)
+        return app
+
+
+if __name__ == '__main__':
+    web.run_app(UpdatesIngest(Config).create_app(), host=Config.BOT["webhook"]["host"], port=Config.BOT["webhook"]["port"])